@@ -1,84 +1,485 @@
 import os
-import tempfile
+import re
+import ast
 import subprocess
 import json
-from typing import List, Dict, Any
+import threading
+from collections import deque
+from contextlib import closing
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import List, Dict, Any, Optional, Callable, Set, Iterable
+from utils.sharding import split_into_shards
+from utils.payload import encode_tests_payload, MISSING_BLOBS_MARKER, PAYLOAD_FORMATS
+from utils.build_log import BuildLog
+from utils.failure_index import FailureIndex
+from utils.path_index import TestFileIndex
+from utils.patching import apply_unified_diff, PatchError
+from utils.workspace import LocalWorkspace, workspace_path
+from utils.pytest_digest import (
+    build_failure_digest, format_failure_digest, has_failure_details,
+    parse_json_report, parse_junit_xml, summarize_results, digest_from_results, split_log_sections
+)
+
+# Moduły testowe wg domyślnych wzorców pytest (test_*.py, *_test.py)
+LOCAL_TEST_MODULE_RE = re.compile(r'(^|/)(test_[^/]*|[^/]*_test)\.py$')
+# Kolejność statusów buildów od najlepszego do najgorszego (przy scalaniu shardów)
+BUILD_STATUS_SEVERITY = {'SUCCESS': 0, 'UNSTABLE': 1, 'NOT_BUILT': 2, 'ABORTED': 3, 'FAILURE': 4}
+# Rozmiar końcówki logu trzymanej w wyniku (pełny log dostępny przez uchwyt 'log')
+LOG_EXCERPT_BYTES = 256 * 1024
+# Końcówka surowego logu wysyłana do modelu, gdy nie rozpoznano wyjścia pytest
+RAW_LOG_PROMPT_BYTES = 16 * 1024
+# Maksymalny rozmiar tekstu w jednym prompcie analizy - większe logi są analizowane fragmentami
+ANALYSIS_CHUNK_CHARS = 12000
+# Limit fragmentów analizowanych dla jednego logu (pierwszeństwo mają fragmenty z błędami)
+MAX_ANALYSIS_CHUNKS = 32
+# Słowa kluczowe wskazujące fragment logu z błędem
+FAILURE_KEYWORDS = ('error', 'fail', 'exception', 'traceback')
+# Schematy JSON ograniczające odpowiedzi modelu (parametr format w Ollama)
+ANALYSIS_SCHEMA = {
+    'type': 'object',
+    'properties': {
+        'summary': {'type': 'string'},
+        'errors': {'type': 'array', 'items': {'type': 'string'}},
+        'suggestions': {'type': 'array', 'items': {'type': 'string'}}
+    },
+    'required': ['summary', 'errors', 'suggestions']
+}
+FIX_SCHEMA = {
+    'type': 'object',
+    'properties': {
+        'problem': {'type': 'string'},
+        'fixed_code': {'type': 'string'}
+    },
+    'required': ['problem', 'fixed_code']
+}
+DIFF_FIX_SCHEMA = {
+    'type': 'object',
+    'properties': {
+        'problem': {'type': 'string'},
+        'diff': {'type': 'string'}
+    },
+    'required': ['problem', 'diff']
+}
+
+def _tracked(callback: Optional[Callable], errors: List[BaseException]) -> Optional[Callable]:
+    """Opakowuje callback tak, by zgłoszone przez niego wyjątki trafiały do listy errors"""
+    if callback is None:
+        return None
+    
+    def call(*args):
+        try:
+            return callback(*args)
+        except BaseException as e:
+            errors.append(e)
+            raise
+    
+    return call
 
 class TestAgent:
-    def __init__(self, ollama_client, gitlab_client, jenkins_client):
+    def __init__(self, ollama_client, gitlab_client, jenkins_client, max_parallel: Optional[int] = None,
+                 failure_index: Optional[FailureIndex] = None, workspace_dir: Optional[str] = None):
         self.ollama = ollama_client
         self.gitlab = gitlab_client
         self.jenkins = jenkins_client
+        # Opcjonalny indeks podobnych awarii - pozwala pominąć ponowną analizę AI
+        self.failure_index = failure_index
+        # Trwały katalog roboczy testów lokalnych (tworzony przy pierwszym uruchomieniu)
+        self.workspace_dir = workspace_dir or os.getenv('LOCAL_WORKSPACE_DIR', os.path.join('.cache', 'workspace'))
+        self._workspaces: Dict[str, LocalWorkspace] = {}
+        # Liczba równoległych zapytań do modelu (domyślnie wg slotów OLLAMA_NUM_PARALLEL)
+        self.max_parallel = max_parallel or int(os.getenv("OLLAMA_NUM_PARALLEL", "4"))
+        # Historyczne czasy wykonania plików testowych (s) i ich rozmiary
+        self.test_durations: Dict[str, float] = {}
+        self._test_sizes: Dict[str, int] = {}
+        # Hashe plików przesłanych już do magazynu danego job'a
+        self._job_blobs: Dict[str, Set[str]] = {}
+        # Limity czasu (s) oczekiwania na build Jenkins i na jego start z kolejki
+        self.build_timeout = int(os.getenv('JENKINS_BUILD_TIMEOUT', '3600'))
+        self.queue_timeout = int(os.getenv('JENKINS_QUEUE_TIMEOUT', '600'))
+        # Format TESTS_DATA: "json" - zwykła lista JSON (zgodna ze starszymi job'ami),
+        # "gz64" - skompresowany z referencjami do plików znanych job'owi (wymaga obsługi w job'ie)
+        self.payload_format = os.getenv('JENKINS_PAYLOAD_FORMAT', 'json')
+        self._lock = threading.Lock()
         
-    def fetch_tests_from_gitlab(self, project_id: str, branch: str = "main", test_path: str = "tests/") -> List[Dict]:
+    def fetch_tests_from_gitlab(self, project_id: str, branch: str = "main", test_path: str = "tests/",
+                                use_archive: bool = False) -> List[Dict]:
         """Pobiera pliki testowe z GitLab repository"""
         try:
-            tests = self.gitlab.get_test_files(project_id, branch, test_path)
+            tests = self.gitlab.get_test_files(project_id, branch, test_path, use_archive=use_archive)
             return tests
         except Exception as e:
             raise Exception(f"Błąd pobierania testów z GitLab: {str(e)}")
     
-    def run_tests_locally(self, tests: List[Dict]) -> Dict[str, Any]:
-        """Uruchamia testy lokalnie"""
+    def run_tests_locally(self, tests: List[Dict], workers: int = 1, rerun: str = "all",
+                          workspace_key: str = "default") -> Dict[str, Any]:
+        """Uruchamia testy lokalnie w trwałym workspace (workers: liczba procesów pytest, 0 - liczba rdzeni;
+        rerun: "all", "failed" - tylko testy, które nie przeszły, "changed" - tylko zmienione pliki;
+        workspace_key: osobny workspace np. dla projektu i gałęzi)"""
         try:
-            # Utworzenie tymczasowego katalogu
-            with tempfile.TemporaryDirectory() as temp_dir:
-                # Zapisanie plików testowych
-                for test in tests:
-                    file_path = os.path.join(temp_dir, test['name'])
-                    os.makedirs(os.path.dirname(file_path), exist_ok=True)
-                    with open(file_path, 'w') as f:
-                        f.write(test['content'])
-                
-                # Uruchomienie pytest
-                result = subprocess.run(
-                    ['python', '-m', 'pytest', temp_dir, '-v'],
-                    capture_output=True,
-                    text=True,
-                    cwd=temp_dir
-                )
-                
-                return {
-                    'success': result.returncode == 0,
-                    'output': result.stdout + result.stderr,
-                    'return_code': result.returncode
-                }
+            workspace = self._workspaces.get(workspace_key)
+            if workspace is None:
+                workspace = LocalWorkspace(workspace_path(self.workspace_dir, workspace_key))
+                self._workspaces[workspace_key] = workspace
+            
+            # Blokada pliku chroni workspace przed równoległymi sesjami / procesami
+            with workspace.locked():
+                return self._run_in_workspace(workspace, tests, workers, rerun)
                 
         except Exception as e:
             raise Exception(f"Błąd uruchamiania testów lokalnie: {str(e)}")
     
-    def run_tests_on_jenkins(self, job_name: str, tests: List[Dict]) -> Dict[str, Any]:
-        """Uruchamia testy na Jenkins"""
-        try:
-            # Przygotowanie parametrów dla job'a
-            params = {
-                'TESTS_DATA': json.dumps(tests),
-                'RUN_TESTS': 'true'
+    def _run_in_workspace(self, workspace: LocalWorkspace, tests: List[Dict], workers: int,
+                          rerun: str) -> Dict[str, Any]:
+        """Synchronizuje workspace, wybiera testy wg trybu rerun, uruchamia je i zapisuje wyniki"""
+        # Zapisanie tylko nowych / zmienionych plików testowych
+        changed, _ = workspace.sync(tests)
+        
+        test_modules = [test for test in tests if LOCAL_TEST_MODULE_RE.search(test['name'])] or tests
+        nodeids_by_file: Optional[Dict[str, List[str]]] = None
+        
+        if rerun == "failed":
+            nodeids_by_file = {}
+            for nodeid in workspace.failed_tests():
+                nodeids_by_file.setdefault(nodeid.split('::')[0], []).append(nodeid)
+            selected = [test for test in test_modules if test['name'] in nodeids_by_file]
+        elif rerun == "changed":
+            changed_set = set(changed)
+            module_names = {test['name'] for test in test_modules}
+            # Zmiana conftest / helpera może wpłynąć na wszystkie testy
+            if changed_set - module_names:
+                selected = test_modules
+            else:
+                selected = [test for test in test_modules if test['name'] in changed_set]
+        else:
+            selected = test_modules
+        
+        if not selected:
+            return {
+                'success': True,
+                'output': f"Brak testów do uruchomienia (tryb: {rerun})",
+                'return_code': 0,
+                'shards': 0,
+                'test_results': [],
+                'summary': {},
+                'rerun': rerun,
+                'selected': 0
             }
+        
+        workers = workers or os.cpu_count() or 1
+        result = self._run_pytest_shards(workspace.path, selected, workers, nodeids_by_file)
+        
+        if nodeids_by_file is None:
+            workspace.record_results(result['test_results'], replace_files=[test['name'] for test in selected])
+        else:
+            # Testy, których już nie ma, nie powinny być ponownie uruchamiane
+            requested = [nodeid for test in selected for nodeid in nodeids_by_file[test['name']]]
+            workspace.record_results(result['test_results'], replace_nodeids=requested)
+        
+        result.update(rerun=rerun, selected=len(selected))
+        return result
+    
+    def _run_pytest_shards(self, workspace_path: str, test_modules: List[Dict], workers: int,
+                           nodeids_by_file: Optional[Dict[str, List[str]]] = None) -> Dict[str, Any]:
+        """Dzieli pliki testowe na shardy wg czasów wykonania i uruchamia osobne procesy pytest równolegle"""
+        weights = self._test_weights(test_modules)
+        test_shards = split_into_shards(test_modules, workers, lambda test: weights[test['name']])
+        # Bez plików .pyc - pliki w workspace są nadpisywane i stary cache mógłby zostać użyty
+        env = dict(os.environ, PYTHONDONTWRITEBYTECODE='1')
+        
+        def run_shard(numbered):
+            index, shard = numbered
+            junit_path = os.path.join(workspace_path, f".junit-{index}.xml")
+            targets = []
+            for test in shard:
+                targets.extend(nodeids_by_file[test['name']] if nodeids_by_file is not None else [test['name']])
             
-            # Uruchomienie job'a
-            build_number = self.jenkins.trigger_build(job_name, params)
+            result = subprocess.run(
+                ['python', '-m', 'pytest', '-v', '--rootdir', workspace_path, '-p', 'no:cacheprovider',
+                 f'--junitxml={junit_path}', '-o', 'junit_family=xunit1'] + targets,
+                capture_output=True,
+                text=True,
+                cwd=workspace_path,
+                env=env
+            )
+            results = []
+            if os.path.exists(junit_path):
+                with open(junit_path, 'r', encoding='utf-8') as f:
+                    results = parse_junit_xml(f.read())
+                os.remove(junit_path)
+            return result, results
+        
+        # Każdy shard to osobny proces pytest - wątki tylko na nie czekają
+        with ThreadPoolExecutor(max_workers=len(test_shards)) as executor:
+            shard_runs = list(executor.map(run_shard, enumerate(test_shards, 1)))
+        
+        outputs = []
+        test_results: List[Dict[str, Any]] = []
+        return_codes = []
+        for index, (shard, (result, results)) in enumerate(zip(test_shards, shard_runs), 1):
+            if len(test_shards) > 1:
+                outputs.append(f"### Shard {index}/{len(test_shards)} (plików: {len(shard)}) - kod {result.returncode} ###")
+            outputs.append(result.stdout + result.stderr)
+            test_results.extend(results)
+            return_codes.append(result.returncode)
+        
+        if nodeids_by_file is None:
+            self._record_test_durations(test_modules, test_results)
+        
+        # Kod 5 (brak testów) w pojedynczym shardzie nie jest błędem, o ile inne shardy coś uruchomiły
+        relevant_codes = [code for code in return_codes if code != 5] or return_codes
+        return_code = max(relevant_codes)
+        
+        return {
+            'success': return_code == 0,
+            'output': "\n".join(outputs),
+            'return_code': return_code,
+            'shards': len(test_shards),
+            'test_results': test_results,
+            'summary': summarize_results(test_results)
+        }
+    
+    def run_tests_on_jenkins(self, job_name: str, tests: List[Dict],
+                             on_log: Optional[Callable[[str], None]] = None, shards: int = 1,
+                             build_timeout: Optional[int] = None, queue_timeout: Optional[int] = None,
+                             payload_format: Optional[str] = None) -> Dict[str, Any]:
+        """Uruchamia testy na Jenkins (limity czasu w sekundach i format TESTS_DATA - domyślnie ustawienia agenta)"""
+        try:
+            payload_format = payload_format or self.payload_format
+            if payload_format not in PAYLOAD_FORMATS:
+                raise Exception(f"Nieznany format TESTS_DATA: {payload_format}")
             
-            # Oczekiwanie na zakończenie
-            status = self.jenkins.wait_for_build(job_name, build_number)
+            options = (build_timeout or self.build_timeout, queue_timeout or self.queue_timeout, payload_format)
+            if shards > 1 and len(tests) > 1:
+                return self._run_sharded_on_jenkins(job_name, tests, shards, *options)
             
-            # Pobranie logów
-            logs = self.jenkins.get_build_logs(job_name, build_number)
+            result = self._run_jenkins_build(job_name, tests, on_log, *options)
             
             return {
-                'build_number': build_number,
-                'status': status,
-                'logs': logs,
-                'success': status == 'SUCCESS'
+                'build_number': result['build_number'],
+                'status': result['status'],
+                'test_results': result['test_results'],
+                'summary': summarize_results(result['test_results']) if result['test_results'] else None,
+                'log': result['log'],
+                'logs': result['log'].tail(LOG_EXCERPT_BYTES),
+                'log_size': result['log'].size,
+                'success': result['status'] == 'SUCCESS'
             }
             
         except Exception as e:
             raise Exception(f"Błąd uruchamiania testów na Jenkins: {str(e)}")
     
-    def analyze_jenkins_logs(self, jenkins_result: Dict[str, Any]) -> Dict[str, Any]:
+    def _run_jenkins_build(self, job_name: str, tests: List[Dict],
+                           on_log: Optional[Callable[[str], None]] = None,
+                           build_timeout: int = 3600, queue_timeout: int = 600,
+                           payload_format: str = "json") -> Dict[str, Any]:
+        """Uruchamia jeden build z podanymi testami i czeka na jego zakończenie"""
+        known_hashes: Set[str] = set()
+        if payload_format == "gz64":
+            with self._lock:
+                known_hashes = set(self._job_blobs.get(job_name, ()))
+        
+        while True:
+            # Przygotowanie parametrów dla job'a - w formacie gz64 pliki znane job'owi wysyłane tylko jako hash
+            if payload_format == "gz64":
+                payload, hashes = encode_tests_payload(tests, known_hashes)
+            else:
+                payload, hashes = json.dumps(tests), []
+            params = {
+                'TESTS_DATA': payload,
+                'RUN_TESTS': 'true'
+            }
+            
+            # Uruchomienie job'a
+            build_number = self.jenkins.trigger_build(job_name, params, queue_timeout=queue_timeout)
+            
+            # Oczekiwanie na zakończenie z przyrostowym pobieraniem logów
+            status, log = self.jenkins.wait_for_build_with_logs(job_name, build_number, timeout=build_timeout,
+                                                                on_log=on_log)
+            
+            # Workspace nie ma części plików (np. inny węzeł) - ponowienie z pełną treścią
+            if known_hashes and log.contains(MISSING_BLOBS_MARKER):
+                log.close()
+                with self._lock:
+                    self._job_blobs.pop(job_name, None)
+                known_hashes = set()
+                continue
+            
+            if hashes:
+                with self._lock:
+                    self._job_blobs.setdefault(job_name, set()).update(hashes)
+            break
+        
+        # Czas trwania buildu (ms) do zapamiętania historycznych czasów testów
+        try:
+            duration = self.jenkins.get_build_info(job_name, build_number).get('duration', 0) / 1000
+        except Exception:
+            duration = 0
+        
+        # Ustrukturyzowane wyniki z artefaktu pytest-json-report (jeśli job go archiwizuje)
+        try:
+            report = self.jenkins.get_json_report(job_name, build_number)
+        except Exception as e:
+            print(f"Nie udało się pobrać raportu JSON: {e}")
+            report = None
+        test_results = parse_json_report(report) if report else None
+        
+        if test_results:
+            self._record_test_durations(tests, test_results)
+        else:
+            self._record_build_duration(tests, duration)
+        
+        return {
+            'build_number': build_number,
+            'status': status,
+            'log': log,
+            'duration': duration,
+            'test_results': test_results
+        }
+    
+    def _run_sharded_on_jenkins(self, job_name: str, tests: List[Dict], shards: int,
+                                build_timeout: int = 3600, queue_timeout: int = 600,
+                                payload_format: str = "json") -> Dict[str, Any]:
+        """Dzieli testy na shardy o zbliżonym czasie i uruchamia równolegle osobne buildy"""
+        weights = self._test_weights(tests)
+        test_shards = split_into_shards(tests, shards, lambda test: weights[test['name']])
+        
+        with ThreadPoolExecutor(max_workers=len(test_shards)) as executor:
+            futures = [
+                executor.submit(self._run_jenkins_build, job_name, shard, None,
+                                build_timeout, queue_timeout, payload_format)
+                for shard in test_shards
+            ]
+            results = [future.result() for future in futures]
+        
+        # Scalenie wyników - status całości to najgorszy status shardów
+        status = max((result['status'] for result in results), key=lambda s: BUILD_STATUS_SEVERITY.get(s, 3))
+        log = BuildLog()
+        for i, result in enumerate(results, 1):
+            log.append(f"===== Shard {i}/{len(results)} - build #{result['build_number']} ({result['status']}) =====\n")
+            for chunk in result['log'].iter_chunks():
+                log.append(chunk)
+            log.append("\n")
+            result['log'].close()
+        
+        # Wyniki testów scalane tylko gdy każdy shard dostarczył raport
+        test_results = None
+        if all(result['test_results'] is not None for result in results):
+            test_results = [test for result in results for test in result['test_results']]
+        
+        return {
+            'build_number': results[0]['build_number'],
+            'build_numbers': [result['build_number'] for result in results],
+            'status': status,
+            'test_results': test_results,
+            'summary': summarize_results(test_results) if test_results else None,
+            'log': log,
+            'logs': log.tail(LOG_EXCERPT_BYTES),
+            'log_size': log.size,
+            'success': all(result['status'] == 'SUCCESS' for result in results),
+            'shards': [{
+                'build_number': result['build_number'],
+                'status': result['status'],
+                'duration': result['duration'],
+                'files': [test['name'] for test in shard]
+            } for result, shard in zip(results, test_shards)]
+        }
+    
+    def _test_weights(self, tests: List[Dict]) -> Dict[str, float]:
+        """Szacowane czasy wykonania plików testowych (historyczne lub na podstawie rozmiaru)"""
+        with self._lock:
+            durations = dict(self.test_durations)
+            sizes = dict(self._test_sizes)
+        
+        # Przeliczenie rozmiaru na sekundy na podstawie plików o znanym czasie
+        known_size = sum(sizes[name] for name in durations if name in sizes)
+        seconds_per_byte = sum(durations[name] for name in durations if name in sizes) / known_size if known_size else 1
+        
+        weights = {}
+        for test in tests:
+            if test['name'] in durations:
+                weights[test['name']] = durations[test['name']]
+            else:
+                weights[test['name']] = (test.get('size') or len(test['content'])) * seconds_per_byte
+        return weights
+    
+    def _record_test_durations(self, tests: List[Dict], test_results: List[Dict[str, Any]]):
+        """Zapamiętuje czasy plików testowych zsumowane z czasów pojedynczych testów"""
+        durations: Dict[str, float] = {}
+        for result in test_results:
+            file_name = result['nodeid'].split('::')[0]
+            durations[file_name] = durations.get(file_name, 0) + result['duration']
+        with self._lock:
+            for test in tests:
+                if test['name'] in durations:
+                    self.test_durations[test['name']] = durations[test['name']]
+                    self._test_sizes[test['name']] = test.get('size') or len(test['content'])
+    
+    def _record_build_duration(self, tests: List[Dict], duration: float):
+        """Rozdziela czas buildu na pliki proporcjonalnie do rozmiaru (gdy brak dokładniejszych danych)"""
+        if duration <= 0 or not tests:
+            return
+        
+        sizes = {test['name']: test.get('size') or len(test['content']) for test in tests}
+        total_size = sum(sizes.values()) or 1
+        with self._lock:
+            for name, size in sizes.items():
+                self.test_durations[name] = duration * size / total_size
+                self._test_sizes[name] = size
+    
+    def _generate(self, prompt: str, on_token: Optional[Callable[[str], None]] = None,
+                  response_format: Optional[Dict[str, Any]] = None) -> str:
+        """Generuje odpowiedź modelu - strumieniowo gdy podano on_token"""
+        if on_token is None:
+            return self.ollama.generate(prompt, response_format=response_format)
+        
+        tokens = []
+        with closing(self.ollama.generate_stream(prompt, response_format=response_format)) as stream:
+            for token in stream:
+                tokens.append(token)
+                on_token(token)
+        return ''.join(tokens)
+    
+    def analyze_jenkins_logs(self, jenkins_result: Dict[str, Any],
+                             on_token: Optional[Callable[[str], None]] = None) -> Dict[str, Any]:
         """Analizuje logi Jenkins przy użyciu AI"""
         try:
-            logs = jenkins_result['logs']
+            # Do modelu trafia zestawienie niepowodzeń zamiast pełnej konsoli
+            digest = self.build_failure_digest(jenkins_result)
+            if has_failure_details(digest):
+                logs = format_failure_digest(digest, max_chars=None)
+                lines: Iterable[str] = logs.splitlines()
+                signature = format_failure_digest(digest)
+            else:
+                log = jenkins_result.get('log')
+                if log is not None:
+                    logs = log.tail(RAW_LOG_PROMPT_BYTES) if log.size <= RAW_LOG_PROMPT_BYTES else None
+                    lines = log.iter_lines()
+                    signature = log.tail(RAW_LOG_PROMPT_BYTES)
+                else:
+                    logs = jenkins_result['logs']
+                    lines = logs.splitlines()
+                    signature = logs[-RAW_LOG_PROMPT_BYTES:]
+            
+            # Podobna awaria była już analizowana - zwracamy zapamiętaną analizę bez generowania
+            embedding = None
+            if self.failure_index is not None:
+                signature = f"Status buildu: {jenkins_result['status']}\n{signature}"
+                try:
+                    embedding = self.ollama.embed(signature)
+                except Exception:
+                    embedding = None
+                if embedding is not None:
+                    match = self.failure_index.lookup(embedding)
+                    if match is not None:
+                        analysis = dict(match['analysis'])
+                        analysis['cached'] = True
+                        analysis['similarity'] = round(match['similarity'], 3)
+                        analysis.update(failed_tests=digest['failed'], locations=digest['locations'])
+                        return analysis
+            
+            if logs is None or len(logs) > ANALYSIS_CHUNK_CHARS:
+                # Log nie mieści się w jednym prompcie - streszczenia fragmentów, potem scalenie
+                logs = self._summarize_log_chunks(jenkins_result['status'], lines)
             
             prompt = f"""
             Przeanalizuj logi z wykonania testów na Jenkins i zidentyfikuj problemy:
@@ -101,7 +502,7 @@ class TestAgent:
             }}
             """
             
-            response = self.ollama.generate(prompt)
+            response = self._generate(prompt, on_token, response_format=ANALYSIS_SCHEMA)
             
             try:
                 analysis = json.loads(response)
@@ -112,57 +513,225 @@ class TestAgent:
                     "errors": ["Nie udało się sparsować odpowiedzi AI"],
                     "suggestions": ["Sprawdź logi ręcznie"]
                 }
+            else:
+                if embedding is not None:
+                    # Kopia - poniższe uzupełnienie o testy z digestu nie może trafić do indeksu
+                    self.failure_index.add(embedding, dict(analysis), signature)
             
+            # Testy i lokalizacje z digestu - pozwalają wskazać pliki do poprawy bez szukania w tekście AI
+            analysis.update(failed_tests=digest['failed'], locations=digest['locations'])
             return analysis
             
         except Exception as e:
             raise Exception(f"Błąd analizy logów: {str(e)}")
     
-    def generate_test_fixes(self, tests: List[Dict], analysis: Dict[str, Any]) -> List[Dict]:
-        """Generuje poprawki dla testów na podstawie analizy"""
+    @staticmethod
+    def _select_log_chunks(chunks: Iterable[str], limit: int = MAX_ANALYSIS_CHUNKS) -> List[str]:
+        """Wybiera do analizy fragmenty z błędami (najpóźniejsze) oraz ostatni fragment logu"""
+        selected: deque = deque(maxlen=limit)
+        last = None
+        for index, chunk in enumerate(chunks):
+            last = (index, chunk)
+            lowered = chunk.lower()
+            if any(keyword in lowered for keyword in FAILURE_KEYWORDS):
+                selected.append((index, chunk))
+        
+        if last is not None and (not selected or selected[-1][0] != last[0]):
+            if len(selected) == limit:
+                selected.popleft()
+            selected.append(last)
+        return [chunk for _, chunk in selected]
+    
+    def _summarize_log_chunks(self, status: str, lines: Iterable[str]) -> str:
+        """Etap map - równolegle streszcza fragmenty logu, zwraca połączone streszczenia"""
+        chunks = self._select_log_chunks(split_log_sections(lines, ANALYSIS_CHUNK_CHARS))
+        
+        def summarize(numbered):
+            number, chunk = numbered
+            prompt = f"""
+            Poniżej fragment {number}/{len(chunks)} logu z wykonania testów na Jenkins (status buildu: {status}).
+            Wypisz zwięźle błędy, nazwy testów, pliki i komunikaty wyjątków widoczne w tym fragmencie.
+            Jeśli fragment nie zawiera błędów, odpowiedz "brak błędów".
+            
+            Fragment:
+            {chunk}
+            """
+            return self.ollama.generate(prompt).strip()
+        
+        executor = ThreadPoolExecutor(max_workers=max(1, min(self.max_parallel, len(chunks))))
         try:
-            fixes = []
+            summaries = list(executor.map(summarize, enumerate(chunks, 1)))
+        finally:
+            # Błąd lub przerwanie - pozostałe fragmenty nie są już streszczane
+            executor.shutdown(wait=False, cancel_futures=True)
+        
+        return "\n\n".join(
+            f"Streszczenie fragmentu {number}/{len(chunks)}:\n{summary}"
+            for number, summary in enumerate(summaries, 1)
+        )
+    
+    def build_failure_digest(self, jenkins_result: Dict[str, Any]) -> Dict[str, Any]:
+        """Wyciąga z logów buildu zestawienie niepowodzeń pytest"""
+        if jenkins_result.get('test_results'):
+            return digest_from_results(jenkins_result['test_results'])
+        
+        log = jenkins_result.get('log')
+        lines = log.iter_lines() if log is not None else jenkins_result.get('logs', '').splitlines()
+        return build_failure_digest(lines)
+    
+    def generate_test_fixes(self, tests: List[Dict], analysis: Dict[str, Any],
+                            on_token: Optional[Callable[[str, str], None]] = None,
+                            max_workers: Optional[int] = None,
+                            on_progress: Optional[Callable[[str, int, int], None]] = None,
+                            mode: str = "full") -> List[Dict]:
+        """Generuje poprawki dla testów na podstawie analizy (mode: "full" - cały plik, "diff" - unified diff).
+        Przy więcej niż jednym procesie roboczym tokeny nie są strumieniowane (on_token wywoływany tylko szeregowo),
+        a postęp raportuje on_progress"""
+        # Wyjątki z callbacków (np. przerwanie skryptu Streamlit) przekazywane są dalej bez zmian
+        callback_errors: List[BaseException] = []
+        on_token = _tracked(on_token, callback_errors)
+        on_progress = _tracked(on_progress, callback_errors)
+        
+        try:
+            # Pliki do poprawy: node ID i lokalizacje z digestu oraz ścieżki wymienione w błędach
+            selected = TestFileIndex(tests).select(
+                analysis.get('failed_tests', []),
+                analysis.get('locations', []),
+                analysis.get('errors', [])
+            )
+            workers = max(1, min(max_workers or self.max_parallel, len(selected) or 1))
+            results: List[Optional[Dict]] = [None] * len(selected)
             
-            for test in tests:
-                if any(error for error in analysis['errors'] if test['name'] in error):
-                    prompt = f"""
-                    Na podstawie analizy błędów:
-                    Błędy: {analysis['errors']}
-                    Sugestie: {analysis['suggestions']}
-                    
-                    Popraw następujący test:
-                    
-                    Nazwa pliku: {test['name']}
-                    Kod:
-                    {test['content']}
-                    
-                    Zwróć poprawiony kod wraz z opisem problemu.
-                    Format odpowiedzi:
-                    PROBLEM: opis problemu
-                    FIXED_CODE:
-                    [poprawiony kod]
-                    """
-                    
-                    response = self.ollama.generate(prompt)
-                    
-                    # Parsowanie odpowiedzi
-                    if "PROBLEM:" in response and "FIXED_CODE:" in response:
-                        parts = response.split("FIXED_CODE:")
-                        problem = parts[0].replace("PROBLEM:", "").strip()
-                        fixed_code = parts[1].strip()
-                        
-                        fixes.append({
-                            'file': test['name'],
-                            'problem': problem,
-                            'original_code': test['content'],
-                            'fixed_code': fixed_code
-                        })
-            
-            return fixes
+            if workers == 1:
+                # Szeregowo - tokeny można pokazywać na bieżąco
+                for index, test in enumerate(selected):
+                    file_on_token = (lambda token, name=test['name']: on_token(name, token)) if on_token else None
+                    results[index] = self._generate_fix(test, analysis, file_on_token, mode)
+                    if on_progress:
+                        on_progress(test['name'], index + 1, len(selected))
+            else:
+                # Równolegle - postęp raportowany z bieżącego wątku po zakończeniu każdego pliku
+                executor = ThreadPoolExecutor(max_workers=workers)
+                try:
+                    futures = {
+                        executor.submit(self._generate_fix, test, analysis, None, mode): index
+                        for index, test in enumerate(selected)
+                    }
+                    for done, future in enumerate(as_completed(futures), 1):
+                        index = futures[future]
+                        results[index] = future.result()
+                        if on_progress:
+                            on_progress(selected[index]['name'], done, len(selected))
+                finally:
+                    # Przy przerwaniu nie czekamy na pozostałe pliki - oczekujące zadania są anulowane
+                    executor.shutdown(wait=False, cancel_futures=True)
+            
+            # Kolejność poprawek zgodna z kolejnością testów
+            return [fix for fix in results if fix is not None]
             
         except Exception as e:
+            if any(e is error for error in callback_errors):
+                raise
             raise Exception(f"Błąd generowania poprawek: {str(e)}")
     
+    def _generate_fix(self, test: Dict, analysis: Dict[str, Any],
+                      on_token: Optional[Callable[[str], None]] = None, mode: str = "full") -> Optional[Dict]:
+        """Generuje poprawkę pojedynczego pliku testowego"""
+        if mode == "diff":
+            fix = self._generate_diff_fix(test, analysis, on_token)
+            if fix is not None:
+                return fix
+            # Diff nie dał się nałożyć - generujemy cały plik
+        
+        prompt = f"""
+        Na podstawie analizy błędów:
+        Błędy: {analysis['errors']}
+        Sugestie: {analysis['suggestions']}
+        
+        Popraw następujący test:
+        
+        Nazwa pliku: {test['name']}
+        Kod:
+        {test['content']}
+        
+        Zwróć poprawiony kod wraz z opisem problemu.
+        Odpowiedz w formacie JSON:
+        {{
+            "problem": "opis problemu",
+            "fixed_code": "pełny poprawiony kod pliku"
+        }}
+        """
+        
+        response = self._generate(prompt, on_token, response_format=FIX_SCHEMA)
+        
+        try:
+            result = json.loads(response)
+            if result.get('fixed_code'):
+                return {
+                    'file': test['name'],
+                    'problem': result.get('problem', ''),
+                    'original_code': test['content'],
+                    'fixed_code': result['fixed_code']
+                }
+        except (json.JSONDecodeError, AttributeError):
+            pass
+        
+        # Fallback dla modeli ignorujących format - dawny format tekstowy
+        if "PROBLEM:" in response and "FIXED_CODE:" in response:
+            parts = response.split("FIXED_CODE:")
+            problem = parts[0].replace("PROBLEM:", "").strip()
+            fixed_code = parts[1].strip()
+            
+            return {
+                'file': test['name'],
+                'problem': problem,
+                'original_code': test['content'],
+                'fixed_code': fixed_code
+            }
+        return None
+    
+    def _generate_diff_fix(self, test: Dict, analysis: Dict[str, Any],
+                           on_token: Optional[Callable[[str], None]] = None) -> Optional[Dict]:
+        """Generuje poprawkę jako unified diff i nakłada ją na oryginalny kod (None gdy się nie da)"""
+        prompt = f"""
+        Na podstawie analizy błędów:
+        Błędy: {analysis['errors']}
+        Sugestie: {analysis['suggestions']}
+        
+        Popraw następujący test, zmieniając tylko niezbędne linie:
+        
+        Nazwa pliku: {test['name']}
+        Kod:
+        {test['content']}
+        
+        Zwróć opis problemu oraz poprawkę w formacie unified diff (nagłówki @@ -linia,liczba +linia,liczba @@,
+        3 linie kontekstu, linie usuwane z "-", dodawane z "+"). Nie przepisuj całego pliku.
+        Odpowiedz w formacie JSON:
+        {{
+            "problem": "opis problemu",
+            "diff": "@@ -10,3 +10,3 @@\\n kontekst\\n-stara linia\\n+nowa linia\\n kontekst"
+        }}
+        """
+        
+        response = self._generate(prompt, on_token, response_format=DIFF_FIX_SCHEMA)
+        
+        try:
+            result = json.loads(response)
+            fixed_code = apply_unified_diff(test['content'], result['diff'])
+            # Diff nałożony na niewłaściwe miejsce daje zwykle niepoprawny składniowo plik
+            if test['name'].endswith('.py'):
+                ast.parse(fixed_code, filename=test['name'])
+        except (json.JSONDecodeError, KeyError, TypeError, AttributeError, PatchError, SyntaxError, ValueError):
+            return None
+        
+        return {
+            'file': test['name'],
+            'problem': result.get('problem', ''),
+            'original_code': test['content'],
+            'fixed_code': fixed_code,
+            'diff': result['diff']
+        }
+    
     def apply_fix(self, fix: Dict[str, Any]) -> bool:
         """Aplikuje poprawkę do pliku"""
         try:
@@ -181,9 +750,35 @@ class TestAgent:
         except Exception as e:
             raise Exception(f"Błąd aktualizacji pliku w GitLab: {str(e)}")
     
-    def create_merge_request(self, project_id: str, title: str, description: str, source_branch: str) -> str:
+    def save_fixes_to_gitlab(self, project_id: str, fixes: List[Dict], commit_message: Optional[str] = None,
+                             branch: str = "main", new_branch: Optional[str] = None) -> Dict:
+        """Zapisuje poprawki do GitLab jednym commitem (opcjonalnie na nowej gałęzi)"""
+        try:
+            if not fixes:
+                raise Exception("Brak poprawek do zapisania")
+            
+            if commit_message is None:
+                if len(fixes) == 1:
+                    commit_message = f"AI fix: {fixes[0]['problem'][:50]}..."
+                else:
+                    files_list = "\n".join(f"- {fix['file']}" for fix in fixes)
+                    commit_message = f"AI fix: {len(fixes)} poprawek testów\n\n{files_list}"
+            
+            # Poprawiane pliki pochodzą z tej gałęzi - bez sprawdzania istnienia przed commitem
+            files = [{'file_path': fix['file'], 'content': fix['fixed_code'], 'action': 'update'} for fix in fixes]
+            
+            if new_branch:
+                return self.gitlab.commit_files(project_id, files, commit_message,
+                                                branch=new_branch, start_branch=branch)
+            return self.gitlab.commit_files(project_id, files, commit_message, branch=branch)
+            
+        except Exception as e:
+            raise Exception(f"Błąd zapisu poprawek do GitLab: {str(e)}")
+    
+    def create_merge_request(self, project_id: str, title: str, description: str, source_branch: str,
+                             target_branch: str = "main") -> str:
         """Tworzy merge request w GitLab"""
         try:
-            return self.gitlab.create_merge_request(project_id, title, description, source_branch)
+            return self.gitlab.create_merge_request(project_id, title, description, source_branch, target_branch)
         except Exception as e:
             raise Exception(f"Błąd tworzenia merge request: {str(e)}") 
\ No newline at end of file
@@ -5,6 +5,8 @@ from agents.test_agent import TestAgent
 from utils.gitlab_client import GitLabClient
 from utils.jenkins_client import JenkinsClient
 from utils.ollama_client import OllamaClient
+from utils.response_cache import ResponseCache
+from utils.failure_index import FailureIndex
 
 # Ładowanie zmiennych środowiskowych
 load_dotenv()
@@ -26,6 +28,10 @@ def main():
     st.sidebar.subheader("🧠 Ollama")
     ollama_host = st.sidebar.text_input("Host Ollama", value="http://localhost:11434")
     model_name = st.sidebar.text_input("Model", value="gemma2:7b")
+    use_response_cache = st.sidebar.checkbox("💾 Cache odpowiedzi AI", value=False,
+                                             help="Identyczne prompty zwracają zapamiętaną odpowiedź")
+    use_failure_index = st.sidebar.checkbox("♻️ Indeks podobnych awarii", value=False,
+                                            help="Podobne awarie (embeddingi Ollama) zwracają wcześniejszą analizę")
     
     # Test połączenia Ollama
     if st.sidebar.button("🔍 Testuj Ollama"):
@@ -104,8 +110,23 @@ def main():
         try:
             with st.spinner("Inicjalizacja agenta..."):
                 # Inicializacja klientów
-                ollama_client = OllamaClient(ollama_host, model_name)
-                gitlab_client = GitLabClient(gitlab_token, gitlab_url)
+                response_cache = None
+                if use_response_cache:
+                    response_cache = ResponseCache(
+                        os.getenv('OLLAMA_CACHE_PATH', os.path.join('.cache', 'ollama_responses.sqlite'))
+                    )
+                ollama_client = OllamaClient(
+                    ollama_host,
+                    model_name,
+                    keep_alive=os.getenv('OLLAMA_KEEP_ALIVE', '30m'),
+                    cache=response_cache,
+                    embed_model=os.getenv('OLLAMA_EMBED_MODEL', 'nomic-embed-text')
+                )
+                gitlab_client = GitLabClient(
+                    gitlab_token,
+                    gitlab_url,
+                    cache_dir=os.getenv('TEST_CACHE_DIR', os.path.join('.cache', 'blobs'))
+                )
                 jenkins_client = JenkinsClient(jenkins_url, jenkins_user, jenkins_token)
                 
                 # Test połączenia Jenkins
@@ -114,8 +135,21 @@ def main():
                     st.error(f"❌ Nie udało się połączyć z Jenkins: {connection_test['message']}")
                     return
                 
+                # Załadowanie modelu już przy starcie, a nie przy pierwszej analizie
+                try:
+                    ollama_client.warm_up()
+                except Exception as e:
+                    st.warning(f"⚠️ Nie udało się załadować modelu {model_name}: {e}")
+                
+                failure_index = None
+                if use_failure_index:
+                    failure_index = FailureIndex(
+                        os.getenv('FAILURE_INDEX_PATH', os.path.join('.cache', 'failure_index.json')),
+                        threshold=float(os.getenv('FAILURE_INDEX_THRESHOLD', '0.92'))
+                    )
+                
                 # Inicializacja agenta
-                agent = TestAgent(ollama_client, gitlab_client, jenkins_client)
+                agent = TestAgent(ollama_client, gitlab_client, jenkins_client, failure_index=failure_index)
                 
                 st.session_state.agent = agent
                 st.session_state.project_id = project_id
@@ -224,6 +258,19 @@ def show_dashboard():
         jenkins_status = "✅" if jenkins_results.get('success') else "❌" if jenkins_results else "⏳"
         st.metric("☁️ Testy Jenkins", jenkins_status)
     
+    ollama_client = st.session_state.get('ollama_client')
+    if ollama_client and ollama_client.cache:
+        cache_stats = ollama_client.cache.stats()
+        st.caption(f"💾 Cache odpowiedzi AI: {cache_stats['entries']} wpisów, "
+                   f"trafienia {cache_stats['hits']}, chybienia {cache_stats['misses']} "
+                   f"(łącznie {cache_stats['total_hits']}/{cache_stats['total_misses']})")
+    
+    agent = st.session_state.get('agent')
+    if agent and agent.failure_index:
+        index_stats = agent.failure_index.stats()
+        st.caption(f"♻️ Indeks podobnych awarii: {index_stats['entries']} wpisów, "
+                   f"trafienia {index_stats['hits']}, chybienia {index_stats['misses']}")
+    
     # Historia działań
     if 'activity_log' not in st.session_state:
         st.session_state.activity_log = []
@@ -297,6 +344,7 @@ def show_fetch_tests():
         branch = st.text_input("Branch", value="main")
     with col2:
         test_path = st.text_input("Ścieżka do testów", value="tests/")
+        use_archive = st.checkbox("📦 Pobierz jako archiwum (jedno żądanie)", value=False)
         
     if st.button("📥 Pobierz Testy", type="primary"):
         if not project_id:
@@ -306,11 +354,18 @@ def show_fetch_tests():
         with st.spinner("Pobieranie testów z GitLab..."):
             try:
                 agent = st.session_state.agent
-                tests = agent.fetch_tests_from_gitlab(project_id, branch, test_path)
+                tests = agent.fetch_tests_from_gitlab(project_id, branch, test_path, use_archive=use_archive)
                 st.session_state.tests = tests
+                st.session_state.tests_source = f"{project_id}@{branch}"
                 st.success(f"✅ Pobrano {len(tests)} plików testowych!")
                 add_activity(f"Pobrano {len(tests)} testów z GitLab ({project_id})")
-                
+
+                fetch_errors = getattr(agent.gitlab, 'fetch_errors', [])
+                if fetch_errors:
+                    with st.expander(f"⚠️ Nie udało się pobrać {len(fetch_errors)} plików"):
+                        for error in fetch_errors:
+                            st.write(f"• {error['path']}: {error['error']}")
+
                 if tests:
                     st.subheader("📄 Pobrane pliki testowe:")
                     for test_file in tests:
@@ -337,11 +392,26 @@ def show_run_tests():
     
     with col1:
         st.subheader("🏠 Uruchom lokalnie")
+        local_workers = st.number_input("Liczba procesów pytest", min_value=1, max_value=256,
+                                        value=1, key="local_workers",
+                                        help=f"Pliki testowe są dzielone między procesy wg historycznych czasów wykonania "
+                                             f"(rdzenie tej maszyny: {os.cpu_count()})")
+        local_rerun = st.radio(
+            "Zakres",
+            options=["all", "failed", "changed"],
+            format_func=lambda mode: {"all": "Wszystkie", "failed": "Tylko nieudane",
+                                      "changed": "Tylko zmienione pliki"}[mode],
+            horizontal=True,
+            key="local_rerun",
+            help="Wyniki poprzednich uruchomień są zapamiętywane w lokalnym workspace"
+        )
         if st.button("▶️ Uruchom lokalne testy", type="primary"):
             with st.spinner("Uruchamianie testów lokalnie..."):
                 try:
                     agent = st.session_state.agent
-                    result = agent.run_tests_locally(st.session_state.tests)
+                    result = agent.run_tests_locally(st.session_state.tests, workers=int(local_workers),
+                                                    rerun=local_rerun,
+                                                    workspace_key=st.session_state.get('tests_source', 'default'))
                     st.session_state.local_results = result
                     
                     if result['success']:
@@ -349,6 +419,10 @@ def show_run_tests():
                     else:
                         st.error("❌ Niektóre testy nie przeszły!")
                     
+                    if result.get('summary'):
+                        st.caption(f"🧩 Plików: {result['selected']}, shardy: {result['shards']} | " +
+                                   ", ".join(f"{outcome}: {count}" for outcome, count in sorted(result['summary'].items())))
+                    
                     add_activity(f"Uruchomiono testy lokalnie - {'sukces' if result['success'] else 'błąd'}")
                     
                     with st.expander("📄 Logi testów lokalnych"):
@@ -369,6 +443,21 @@ def show_run_tests():
             job_name = st.text_input("Nazwa job'a Jenkins")
             st.info("💡 Przejdź do tabu 'Jenkins Jobs' aby odświeżyć listę dostępnych job'ów")
         
+        shards = st.number_input("Liczba równoległych buildów (shardów)", min_value=1, max_value=16, value=1)
+        col_build, col_queue = st.columns(2)
+        with col_build:
+            build_timeout = st.number_input("Limit czasu buildu (min)", min_value=1, max_value=24 * 60,
+                                            value=int(os.getenv('JENKINS_BUILD_TIMEOUT', '3600')) // 60)
+        with col_queue:
+            queue_timeout = st.number_input("Limit oczekiwania w kolejce (min)", min_value=1, max_value=24 * 60,
+                                            value=int(os.getenv('JENKINS_QUEUE_TIMEOUT', '600')) // 60)
+        use_compact_payload = st.checkbox(
+            "🗜️ Skompresowany format TESTS_DATA (gz64)",
+            value=os.getenv('JENKINS_PAYLOAD_FORMAT', 'json') == 'gz64',
+            help="Mniejszy parametr i pliki znane job'owi wysyłane tylko jako hash - "
+                 "wymaga job'a z aktualnego example_jenkins_job.xml"
+        )
+        
         if st.button("▶️ Uruchom testy na Jenkins", type="primary"):
             if not job_name:
                 st.error("❌ Podaj nazwę job'a!")
@@ -377,16 +466,48 @@ def show_run_tests():
             with st.spinner(f"Uruchamianie testów na Jenkins ({job_name})..."):
                 try:
                     agent = st.session_state.agent
-                    result = agent.run_tests_on_jenkins(job_name, st.session_state.tests)
+                    
+                    # Podgląd konsoli na żywo (ostatni fragment logów)
+                    live_log = st.empty()
+                    log_tail = ['']
+                    
+                    def show_log_chunk(chunk):
+                        log_tail[0] = (log_tail[0] + chunk)[-5000:]
+                        live_log.code(log_tail[0], language='bash')
+                    
+                    result = agent.run_tests_on_jenkins(
+                        job_name,
+                        st.session_state.tests,
+                        on_log=show_log_chunk,
+                        shards=int(shards),
+                        build_timeout=int(build_timeout) * 60,
+                        queue_timeout=int(queue_timeout) * 60,
+                        payload_format="gz64" if use_compact_payload else "json"
+                    )
+                    live_log.empty()
                     st.session_state.jenkins_results = result
                     
-                    st.success(f"✅ Job uruchomiony! Build #{result['build_number']}")
+                    builds = ", ".join(f"#{n}" for n in result.get('build_numbers', [result['build_number']]))
+                    st.success(f"✅ Job uruchomiony! Build {builds}")
                     st.info(f"📊 Status: {result['status']}")
                     
                     add_activity(f"Uruchomiono job '{job_name}' - build #{result['build_number']}")
                     
+                    if result.get('test_results'):
+                        summary = ", ".join(f"{outcome}: {count}" for outcome, count in sorted(result['summary'].items()))
+                        st.info(f"🧪 Wyniki testów - {summary}")
+                        with st.expander("🧪 Wyniki poszczególnych testów"):
+                            st.dataframe([{
+                                'Test': test['nodeid'],
+                                'Wynik': test['outcome'],
+                                'Czas (s)': round(test['duration'], 3)
+                            } for test in result['test_results']])
+                    
                     if result.get('logs'):
                         with st.expander("📄 Logi Jenkins"):
+                            if result.get('log_size', 0) > len(result['logs']):
+                                st.caption(f"Pokazano koniec logu ({len(result['logs']) // 1024} KB "
+                                           f"z {result['log_size'] // 1024} KB)")
                             st.code(result['logs'], language='bash')
                     
                 except Exception as e:
@@ -404,13 +525,23 @@ def show_analyze_logs():
     st.info(f"📋 Analiza buildu #{jenkins_results['build_number']} - Status: {jenkins_results['status']}")
     
     if st.button("🔍 Analizuj logi AI", type="primary"):
+        # Kliknięcie przerywa bieżące wykonanie skryptu, co zamyka strumień z Ollama
+        st.button("⏹️ Przerwij generowanie", key="stop_analysis")
+        live_output = st.empty()
+        
         with st.spinner("🧠 AI analizuje logi Jenkins..."):
             try:
                 agent = st.session_state.agent
-                analysis = agent.analyze_jenkins_logs(jenkins_results)
+                analysis = agent.analyze_jenkins_logs(jenkins_results, on_token=stream_to(live_output))
+                live_output.empty()
                 st.session_state.log_analysis = analysis
                 
-                add_activity("AI przeanalizował logi Jenkins")
+                if analysis.get('cached'):
+                    st.info(f"♻️ Podobna awaria była już analizowana (podobieństwo {analysis['similarity']}) - "
+                            f"użyto zapamiętanej analizy")
+                    add_activity("Użyto zapamiętanej analizy podobnej awarii")
+                else:
+                    add_activity("AI przeanalizował logi Jenkins")
                 
                 # Wyświetl wyniki analizy
                 col1, col2 = st.columns(2)
@@ -444,14 +575,48 @@ def show_fix_tests():
     analysis = st.session_state.log_analysis
     st.info(f"🎯 Na podstawie analizy: {len(analysis.get('errors', []))} błędów, {len(analysis.get('suggestions', []))} sugestii")
     
+    fix_mode = st.radio(
+        "Tryb poprawek",
+        options=["diff", "full"],
+        format_func=lambda mode: "✂️ Tylko zmienione linie (diff)" if mode == "diff" else "📄 Cały plik",
+        horizontal=True,
+        help="W trybie diff model generuje tylko zmiany; gdy diff nie pasuje, plik jest generowany w całości"
+    )
+    
+    agent = st.session_state.agent
+    if agent.max_parallel > 1:
+        st.caption(f"⚡ Poprawki generowane są równolegle (do {agent.max_parallel} plików naraz) - "
+                   f"podgląd tokenów na żywo jest dostępny tylko przy jednym pliku")
+    
     if st.button("🔧 Wygeneruj poprawki AI", type="primary"):
+        st.button("⏹️ Przerwij generowanie", key="stop_fixes")
+        live_output = st.empty()
+        show_token = stream_to(live_output)
+        current_file = [None]
+        
+        def show_file_token(file_name, token):
+            if file_name != current_file[0]:
+                current_file[0] = file_name
+                show_token(f"\n# --- {file_name} ---\n")
+            show_token(token)
+        
+        progress_bar = st.progress(0.0)
+        
+        def show_progress(file_name, done, total):
+            progress_bar.progress(done / total, text=f"✅ {file_name} ({done}/{total})")
+        
         with st.spinner("🧠 AI generuje poprawki testów..."):
             try:
                 agent = st.session_state.agent
                 fixes = agent.generate_test_fixes(
                     st.session_state.tests, 
-                    analysis
+                    analysis,
+                    on_token=show_file_token,
+                    on_progress=show_progress,
+                    mode=fix_mode
                 )
+                live_output.empty()
+                progress_bar.empty()
                 st.session_state.fixes = fixes
                 
                 add_activity(f"AI wygenerował {len(fixes)} poprawek")
@@ -466,6 +631,10 @@ def show_fix_tests():
                             st.markdown("**🔍 Opis problemu:**")
                             st.write(fix['problem'])
                             
+                            if fix.get('diff'):
+                                st.markdown("**✂️ Zmiany:**")
+                                st.code(fix['diff'], language='diff')
+                            
                             col1, col2 = st.columns(2)
                             
                             with col1:
@@ -491,6 +660,24 @@ def show_fix_tests():
                     
             except Exception as e:
                 st.error(f"❌ Błąd generowania poprawek: {str(e)}")
+    
+    if st.session_state.get('fixes'):
+        show_save_all_fixes(st.session_state.fixes)
+
+def show_save_all_fixes(fixes):
+    """Sekcja zapisu wszystkich poprawek jednym commitem"""
+    st.subheader(f"💾 Zapisz wszystkie poprawki ({len(fixes)}) jednym commitem")
+    
+    col1, col2 = st.columns(2)
+    with col1:
+        base_branch = st.text_input("Gałąź bazowa", value="main", key="fixes_base_branch")
+    with col2:
+        new_branch = st.text_input("Nowa gałąź (opcjonalnie)", value="", key="fixes_new_branch")
+    
+    create_mr = st.checkbox("🔀 Utwórz merge request", value=bool(new_branch), disabled=not new_branch)
+    
+    if st.button("💾 Zapisz wszystkie do GitLab", key="save_all_fixes"):
+        save_all_fixes_to_gitlab(fixes, base_branch, new_branch or None, create_mr and bool(new_branch))
 
 def apply_fix(fix):
     """Aplikuje poprawkę lokalnie"""
@@ -512,13 +699,8 @@ def save_fix_to_gitlab(fix):
             st.error("❌ Brak konfiguracji GitLab")
             return
         
-        commit_message = f"AI fix: {fix['problem'][:50]}..."
-        gitlab_client.update_file(
-            project_id, 
-            fix['file'], 
-            fix['fixed_code'], 
-            commit_message
-        )
+        agent = st.session_state.agent
+        agent.save_fixes_to_gitlab(project_id, [fix])
         
         st.success(f"✅ Poprawka zapisana do GitLab: {fix['file']}")
         add_activity(f"Zapisano poprawkę do GitLab: {fix['file']}")
@@ -526,6 +708,36 @@ def save_fix_to_gitlab(fix):
     except Exception as e:
         st.error(f"❌ Błąd zapisu do GitLab: {e}")
 
+def save_all_fixes_to_gitlab(fixes, base_branch, new_branch=None, create_mr=False):
+    """Zapisuje wszystkie poprawki do GitLab jednym commitem"""
+    try:
+        project_id = st.session_state.get('project_id')
+        
+        if not project_id:
+            st.error("❌ Brak konfiguracji GitLab")
+            return
+        
+        agent = st.session_state.agent
+        commit = agent.save_fixes_to_gitlab(project_id, fixes, branch=base_branch, new_branch=new_branch)
+        
+        st.success(f"✅ Zapisano {len(fixes)} poprawek w commicie {commit['id'][:8]} ({commit['branch']})")
+        add_activity(f"Zapisano {len(fixes)} poprawek do GitLab jednym commitem")
+        
+        if create_mr:
+            files_list = "\n".join(f"- {fix['file']}" for fix in fixes)
+            mr_url = agent.create_merge_request(
+                project_id,
+                f"AI fix: {len(fixes)} poprawek testów",
+                f"Poprawki wygenerowane przez Jenkins Test Agent:\n\n{files_list}",
+                new_branch,
+                base_branch
+            )
+            st.success(f"🔀 Utworzono merge request: {mr_url}")
+            add_activity(f"Utworzono merge request dla gałęzi {new_branch}")
+        
+    except Exception as e:
+        st.error(f"❌ Błąd zapisu do GitLab: {e}")
+
 def create_sample_job():
     """Tworzy przykładowy job w Jenkins"""
     try:
@@ -544,6 +756,16 @@ def create_sample_job():
     except Exception as e:
         st.error(f"❌ Błąd tworzenia job'a: {e}")
 
+def stream_to(placeholder, max_chars=4000):
+    """Zwraca callback wyświetlający strumieniowane tokeny w placeholderze"""
+    streamed = ['']
+    
+    def show_token(token):
+        streamed[0] += token
+        placeholder.code(streamed[0][-max_chars:], language='markdown')
+    
+    return show_token
+
 def add_activity(message):
     """Dodaje wpis do historii działań"""
     if 'activity_log' not in st.session_state:
@@ -0,0 +1,110 @@
+import os
+import hashlib
+import threading
+from typing import Dict, Optional
+
+
+def git_blob_sha(content: bytes) -> str:
+    """Liczy SHA bloba w formacie git (taki sam jak 'id' zwracane przez API)"""
+    header = f"blob {len(content)}\0".encode('utf-8')
+    return hashlib.sha1(header + content).hexdigest()
+
+
+class BlobCache:
+    """Trwały cache zawartości plików na dysku, adresowany SHA bloba, z limitem rozmiaru (LRU)"""
+
+    def __init__(self, cache_dir: str, max_bytes: int = 512 * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        # sha -> (rozmiar, czas ostatniego użycia)
+        self._index: Dict[str, list] = {}
+        self._total_bytes = 0
+
+        os.makedirs(cache_dir, exist_ok=True)
+        self._load_index()
+
+    def _path(self, sha: str) -> str:
+        return os.path.join(self.cache_dir, sha[:2], sha)
+
+    def _load_index(self):
+        """Odtwarza indeks LRU z plików zapisanych na dysku"""
+        for prefix in os.listdir(self.cache_dir):
+            prefix_dir = os.path.join(self.cache_dir, prefix)
+            if not os.path.isdir(prefix_dir):
+                continue
+            for sha in os.listdir(prefix_dir):
+                try:
+                    stat = os.stat(os.path.join(prefix_dir, sha))
+                except OSError:
+                    continue
+                self._index[sha] = [stat.st_size, stat.st_mtime]
+                self._total_bytes += stat.st_size
+
+    def get(self, sha: str) -> Optional[str]:
+        """Zwraca zawartość pliku z cache lub None"""
+        with self._lock:
+            if sha not in self._index:
+                self.misses += 1
+                return None
+            path = self._path(sha)
+            try:
+                with open(path, 'rb') as f:
+                    data = f.read()
+                os.utime(path)
+            except OSError:
+                self._drop(sha)
+                self.misses += 1
+                return None
+            self._index[sha][1] = os.path.getmtime(path)
+            self.hits += 1
+        return data.decode('utf-8')
+
+    def put(self, sha: str, content: str):
+        """Zapisuje zawartość pliku pod podanym SHA"""
+        data = content.encode('utf-8')
+        # Nie zapisujemy treści, która nie zgadza się z SHA (np. inne końce linii)
+        if git_blob_sha(data) != sha or len(data) > self.max_bytes:
+            return
+
+        with self._lock:
+            if sha in self._index:
+                return
+            path = self._path(sha)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+            self._index[sha] = [len(data), os.path.getmtime(path)]
+            self._total_bytes += len(data)
+            self._evict()
+
+    def _drop(self, sha: str):
+        size, _ = self._index.pop(sha)
+        self._total_bytes -= size
+        try:
+            os.remove(self._path(sha))
+        except OSError:
+            pass
+
+    def _evict(self):
+        """Usuwa najdawniej używane pliki aż do zejścia poniżej limitu"""
+        if self._total_bytes <= self.max_bytes:
+            return
+        for sha, _ in sorted(self._index.items(), key=lambda entry: entry[1][1]):
+            if self._total_bytes <= self.max_bytes:
+                break
+            self._drop(sha)
+
+    def stats(self) -> Dict[str, int]:
+        """Zwraca statystyki cache"""
+        with self._lock:
+            return {
+                'files': len(self._index),
+                'bytes': self._total_bytes,
+                'hits': self.hits,
+                'misses': self.misses
+            }
@@ -0,0 +1,96 @@
+import tempfile
+import threading
+from typing import Iterator, Optional, Union
+
+# Domyślny rozmiar logu trzymanego w pamięci zanim trafi do pliku tymczasowego
+DEFAULT_SPOOL_THRESHOLD = 8 * 1024 * 1024
+
+
+class BuildLog:
+    """Log buildu w pliku tymczasowym (w pamięci do progu, potem na dysku) z dostępem do fragmentów"""
+
+    def __init__(self, spool_threshold: int = DEFAULT_SPOOL_THRESHOLD):
+        self._file = tempfile.SpooledTemporaryFile(max_size=spool_threshold, mode='w+b')
+        self._lock = threading.Lock()
+        self.size = 0
+
+    def __len__(self) -> int:
+        return self.size
+
+    @property
+    def on_disk(self) -> bool:
+        """Czy log przekroczył próg i został zapisany na dysk"""
+        return bool(getattr(self._file, '_rolled', False))
+
+    def append(self, chunk: Union[str, bytes]):
+        """Dopisuje fragment na końcu logu"""
+        data = chunk.encode('utf-8') if isinstance(chunk, str) else chunk
+        with self._lock:
+            self._file.seek(0, 2)
+            self._file.write(data)
+            self.size += len(data)
+
+    def read_bytes(self, start: int = 0, end: Optional[int] = None) -> bytes:
+        """Zwraca surowy zakres bajtów [start, end)"""
+        start = max(0, start)
+        end = self.size if end is None else min(end, self.size)
+        if end <= start:
+            return b''
+        with self._lock:
+            self._file.seek(start)
+            return self._file.read(end - start)
+
+    def read_range(self, start: int = 0, end: Optional[int] = None) -> str:
+        """Zwraca zakres bajtów [start, end) jako tekst"""
+        return self.read_bytes(start, end).decode('utf-8', errors='replace')
+
+    def head(self, max_bytes: int = 64 * 1024) -> str:
+        """Zwraca początek logu"""
+        return self.read_range(0, max_bytes)
+
+    def tail(self, max_bytes: int = 64 * 1024) -> str:
+        """Zwraca koniec logu (od początku linii)"""
+        start = max(0, self.size - max_bytes)
+        text = self.read_range(start)
+        if start > 0 and '\n' in text:
+            text = text.split('\n', 1)[1]
+        return text
+
+    def iter_chunks(self, block_size: int = 1024 * 1024) -> Iterator[bytes]:
+        """Iteruje po logu blokami bajtów"""
+        offset = 0
+        while offset < self.size:
+            block = self.read_bytes(offset, offset + block_size)
+            if not block:
+                break
+            offset += len(block)
+            yield block
+
+    def iter_lines(self, block_size: int = 1024 * 1024) -> Iterator[str]:
+        """Iteruje po liniach logu bez wczytywania całości do pamięci"""
+        remainder = b''
+        for block in self.iter_chunks(block_size):
+            lines = (remainder + block).split(b'\n')
+            remainder = lines.pop()
+            for line in lines:
+                yield line.decode('utf-8', errors='replace')
+        if remainder:
+            yield remainder.decode('utf-8', errors='replace')
+
+    def contains(self, needle: str) -> bool:
+        """Sprawdza czy log zawiera podany tekst"""
+        pattern = needle.encode('utf-8')
+        overlap = b''
+        for block in self.iter_chunks():
+            if pattern in overlap + block:
+                return True
+            overlap = block[-len(pattern):]
+        return False
+
+    def text(self) -> str:
+        """Zwraca cały log jako tekst (tylko dla logów o rozsądnym rozmiarze)"""
+        return self.read_range(0)
+
+    def close(self):
+        """Zwalnia plik tymczasowy"""
+        self._file.close()
@@ -0,0 +1,105 @@
+import os
+import json
+import math
+import time
+import tempfile
+import threading
+from typing import Any, Dict, List, Optional
+
+
+def _norm(vector: List[float]) -> float:
+    return math.sqrt(sum(value * value for value in vector))
+
+
+class FailureIndex:
+    """Lokalny indeks wektorowy (JSON na dysku) wcześniejszych awarii i ich analiz"""
+
+    def __init__(self, path: str, threshold: float = 0.92, max_entries: int = 500):
+        self.path = path
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._entries: List[Dict[str, Any]] = []
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        if os.path.exists(path):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    self._entries = json.load(f).get('entries', [])
+            except (OSError, ValueError):
+                # Uszkodzony indeks - zaczynamy od pustego
+                self._entries = []
+
+        for entry in self._entries:
+            entry['norm'] = _norm(entry['embedding'])
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def lookup(self, embedding: List[float]) -> Optional[Dict[str, Any]]:
+        """Zwraca najbardziej podobną awarię powyżej progu ({analysis, similarity, text}) lub None"""
+        norm = _norm(embedding)
+        best, best_score = None, self.threshold
+
+        with self._lock:
+            if norm > 0:
+                for entry in self._entries:
+                    # Wektory innego wymiaru pochodzą z innego modelu embeddingów
+                    if len(entry['embedding']) != len(embedding) or not entry['norm']:
+                        continue
+                    score = sum(a * b for a, b in zip(embedding, entry['embedding'])) / (norm * entry['norm'])
+                    if score >= best_score:
+                        best, best_score = entry, score
+
+            if best is None:
+                self.misses += 1
+                return None
+
+            best['used'] = time.time()
+            self.hits += 1
+            return {'analysis': best['analysis'], 'similarity': best_score, 'text': best.get('text', '')}
+
+    def add(self, embedding: List[float], analysis: Dict[str, Any], text: str = ''):
+        """Dodaje awarię do indeksu i zapisuje go na dysk (usuwając najdawniej używane wpisy)"""
+        now = time.time()
+        with self._lock:
+            self._entries.append({
+                'embedding': list(embedding),
+                'norm': _norm(embedding),
+                'analysis': analysis,
+                'text': text[:2000],
+                'created': now,
+                'used': now
+            })
+            if len(self._entries) > self.max_entries:
+                self._entries.sort(key=lambda entry: entry['used'])
+                del self._entries[:len(self._entries) - self.max_entries]
+            self._save()
+
+    def _save(self):
+        """Zapisuje indeks atomowo (plik tymczasowy + zamiana)"""
+        entries = [{key: value for key, value in entry.items() if key != 'norm'} for entry in self._entries]
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(self.path) or '.', suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump({'entries': entries}, f, ensure_ascii=False)
+            os.replace(temp_path, self.path)
+        except Exception:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+    def stats(self) -> Dict[str, int]:
+        """Zwraca liczbę wpisów oraz trafienia / chybienia w bieżącej sesji"""
+        return {'entries': len(self._entries), 'hits': self.hits, 'misses': self.misses}
+
+    def clear(self):
+        """Usuwa wszystkie wpisy indeksu"""
+        with self._lock:
+            self._entries = []
+            self._save()
@@ -1,55 +1,155 @@
 from github import Github
-from typing import List, Dict
+from typing import List, Dict, Optional, Any
+from concurrent.futures import ThreadPoolExecutor
 import base64
+from urllib.parse import quote
+from utils.blob_cache import BlobCache
+from utils.http_cache import TTLCache, ConditionalSession
+
+TEST_FILE_SUFFIXES = ('.py', '_test.py', 'test_.py')
 
 class GitHubClient:
-    def __init__(self, token: str):
-        self.github = Github(token)
+    def __init__(self, token: str, max_workers: int = 8, cache_dir: Optional[str] = None,
+                 cache_max_bytes: int = 512 * 1024 * 1024, repo_ttl: float = 300,
+                 api_url: str = "https://api.github.com"):
+        self.max_workers = max(1, max_workers)
+        try:
+            # Wyłączenie wbudowanego odstępu między zapytaniami, który serializuje pobieranie blobów
+            self.github = Github(token, pool_size=self.max_workers, seconds_between_requests=None)
+        except TypeError:
+            # Starsze wersje PyGithub nie mają ograniczenia tempa zapytań
+            self.github = Github(token, pool_size=self.max_workers)
+        # Opcjonalny cache plików adresowany SHA bloba
+        self.cache = BlobCache(cache_dir, cache_max_bytes) if cache_dir else None
+        # Błędy pobierania pojedynczych plików z ostatniego wywołania get_test_files
+        self.fetch_errors: List[Dict[str, str]] = []
+        
+        # Cache obiektów repozytoriów oraz zapytania warunkowe (ETag) - odpowiedzi 304 nie zużywają limitu
+        self._repos = TTLCache(ttl=repo_ttl)
+        self.api = ConditionalSession(api_url, {
+            'Authorization': f"token {token}",
+            'Accept': 'application/vnd.github+json'
+        })
+    
+    def _get_repo(self, owner: str, repo_name: str) -> Any:
+        """Zwraca obiekt repozytorium z cache (odświeżany po upływie TTL)"""
+        full_name = f"{owner}/{repo_name}"
+        return self._repos.get_or_create(full_name, lambda: self.github.get_repo(full_name))
         
-    def get_test_files(self, owner: str, repo_name: str, branch: str = "main", test_path: str = "tests/") -> List[Dict]:
-        """Pobiera pliki testowe z repository"""
+    def get_test_files(self, owner: str, repo_name: str, branch: str = "main", test_path: str = "tests/",
+                       max_workers: Optional[int] = None) -> List[Dict]:
+        """Pobiera pliki testowe z repository (jedno zapytanie o drzewo + równoległe bloby)"""
         try:
-            repo = self.github.get_repo(f"{owner}/{repo_name}")
+            self.fetch_errors = []
             
-            # Pobieranie zawartości katalogu testów
-            contents = repo.get_contents(test_path, ref=branch)
+            # Całe drzewo repozytorium jednym (warunkowym) zapytaniem
+            tree = self.api.get_json(
+                f"/repos/{owner}/{repo_name}/git/trees/{quote(branch)}",
+                {'recursive': '1'}
+            )
+            if tree.get('truncated'):
+                # Zbyt duże drzewo - GitHub obcina odpowiedź, wracamy do przeglądania katalogów
+                return self._get_test_files_by_contents(self._get_repo(owner, repo_name), branch, test_path)
             
-            test_files = []
+            prefix = test_path.strip('/')
+            blobs = [element for element in tree.get('tree', [])
+                     if element['type'] == 'blob'
+                     and (not prefix or element['path'].startswith(prefix + '/'))
+                     and element['path'].endswith(TEST_FILE_SUFFIXES)]
             
-            # Rekurencyjne przeszukiwanie katalogów
-            def process_contents(contents_list, current_path=""):
-                for content in contents_list:
-                    if content.type == "file" and content.name.endswith(('.py', '_test.py', 'test_.py')):
-                        # Dekodowanie zawartości pliku
-                        file_content = base64.b64decode(content.content).decode('utf-8')
-                        
-                        test_files.append({
-                            'name': content.path,
-                            'content': file_content,
-                            'sha': content.sha,
-                            'size': content.size
-                        })
-                    
-                    elif content.type == "dir":
-                        # Rekurencyjne przeszukiwanie podkatalogów
-                        sub_contents = repo.get_contents(content.path, ref=branch)
-                        process_contents(sub_contents, content.path)
+            # Pliki o niezmienionym SHA pochodzą z cache
+            results: Dict[int, Dict] = {}
+            missing = []
+            for index, element in enumerate(blobs):
+                cached = self.cache.get(element['sha']) if self.cache else None
+                if cached is not None:
+                    results[index] = {
+                        'name': element['path'],
+                        'content': cached,
+                        'sha': element['sha'],
+                        'size': element.get('size', 0)
+                    }
+                else:
+                    missing.append(index)
             
-            if isinstance(contents, list):
-                process_contents(contents)
-            else:
-                process_contents([contents])
+            # Równoległe pobieranie brakujących blobów, wyniki w kolejności drzewa
+            if missing:
+                repo = self._get_repo(owner, repo_name)
+                workers = max(1, min(max_workers or self.max_workers, len(missing)))
+                with ThreadPoolExecutor(max_workers=workers) as executor:
+                    futures = {index: executor.submit(self._download_blob, repo, blobs[index])
+                               for index in missing}
+                
+                for index, future in futures.items():
+                    try:
+                        results[index] = future.result()
+                    except Exception as e:
+                        self.fetch_errors.append({'path': blobs[index]['path'], 'error': str(e)})
             
-            return test_files
+            return [results[index] for index in sorted(results)]
             
         except Exception as e:
             raise Exception(f"Błąd pobierania plików z GitHub: {str(e)}")
     
+    def _download_blob(self, repo: Any, element: Dict) -> Dict:
+        """Pobiera i dekoduje pojedynczy blob"""
+        blob = repo.get_git_blob(element['sha'])
+        content = base64.b64decode(blob.content).decode('utf-8')
+        
+        if self.cache:
+            self.cache.put(element['sha'], content)
+        
+        return {
+            'name': element['path'],
+            'content': content,
+            'sha': element['sha'],
+            'size': blob.size
+        }
+    
+    def _get_test_files_by_contents(self, repo: Any, branch: str, test_path: str) -> List[Dict]:
+        """Pobiera pliki testowe przeglądając katalogi przez Contents API"""
+        # Pobieranie zawartości katalogu testów
+        contents = repo.get_contents(test_path, ref=branch)
+        
+        test_files = []
+        
+        # Rekurencyjne przeszukiwanie katalogów
+        def process_contents(contents_list, current_path=""):
+            for content in contents_list:
+                if content.type == "file" and content.name.endswith(TEST_FILE_SUFFIXES):
+                    cached = self.cache.get(content.sha) if self.cache else None
+                    if cached is not None:
+                        file_content = cached
+                    else:
+                        # Dekodowanie zawartości pliku
+                        file_content = base64.b64decode(content.content).decode('utf-8')
+                        if self.cache:
+                            self.cache.put(content.sha, file_content)
+                    
+                    test_files.append({
+                        'name': content.path,
+                        'content': file_content,
+                        'sha': content.sha,
+                        'size': content.size
+                    })
+                
+                elif content.type == "dir":
+                    # Rekurencyjne przeszukiwanie podkatalogów
+                    sub_contents = repo.get_contents(content.path, ref=branch)
+                    process_contents(sub_contents, content.path)
+        
+        if isinstance(contents, list):
+            process_contents(contents)
+        else:
+            process_contents([contents])
+        
+        return test_files
+    
     def update_file(self, owner: str, repo_name: str, file_path: str, content: str, 
                    commit_message: str, branch: str = "main") -> bool:
         """Aktualizuje plik w repository"""
         try:
-            repo = self.github.get_repo(f"{owner}/{repo_name}")
+            repo = self._get_repo(owner, repo_name)
             
             # Sprawdzenie czy plik istnieje
             try:
@@ -80,7 +180,7 @@ class GitHubClient:
                           body: str, head_branch: str, base_branch: str = "main") -> str:
         """Tworzy pull request"""
         try:
-            repo = self.github.get_repo(f"{owner}/{repo_name}")
+            repo = self._get_repo(owner, repo_name)
             
             pr = repo.create_pull(
                 title=title,
@@ -92,4 +192,19 @@ class GitHubClient:
             return pr.html_url
             
         except Exception as e:
-            raise Exception(f"Błąd tworzenia pull request: {str(e)}") 
\ No newline at end of file
+            raise Exception(f"Błąd tworzenia pull request: {str(e)}")
+    
+    def get_repo_info(self, owner: str, repo_name: str) -> Dict:
+        """Pobiera informacje o repozytorium"""
+        try:
+            repo = self.api.get_json(f"/repos/{owner}/{repo_name}")
+            return {
+                'id': repo['id'],
+                'name': repo['name'],
+                'path': repo['full_name'],
+                'web_url': repo['html_url'],
+                'default_branch': repo.get('default_branch')
+            }
+            
+        except Exception as e:
+            raise Exception(f"Błąd pobierania informacji o repozytorium: {str(e)}")
@@ -1,54 +1,192 @@
 import gitlab
-from typing import List, Dict
+from typing import List, Dict, Optional, Any
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
 import base64
+import io
+import posixpath
+import requests
+import tarfile
+from urllib.parse import quote
+from utils.blob_cache import BlobCache, git_blob_sha
+from utils.http_cache import TTLCache, ConditionalSession
+
+TEST_FILE_SUFFIXES = ('.py', '_test.py', 'test_.py')
+
+class _ChunkStream(io.RawIOBase):
+    """Strumień plikopodobny nad iteratorem fragmentów odpowiedzi HTTP"""
+    def __init__(self, chunks):
+        self._chunks = iter(chunks)
+        self._buffer = b''
+    
+    def readable(self) -> bool:
+        return True
+    
+    def readinto(self, target) -> int:
+        while not self._buffer:
+            try:
+                self._buffer = next(self._chunks)
+            except StopIteration:
+                return 0
+        size = min(len(target), len(self._buffer))
+        target[:size] = self._buffer[:size]
+        self._buffer = self._buffer[size:]
+        return size
 
 class GitLabClient:
-    def __init__(self, token: str, url: str = "https://gitlab.com"):
+    def __init__(self, token: str, url: str = "https://gitlab.com", max_workers: int = 8,
+                 cache_dir: Optional[str] = None, cache_max_bytes: int = 512 * 1024 * 1024,
+                 project_ttl: float = 300):
         self.gl = gitlab.Gitlab(url, private_token=token)
+        self.max_workers = max(1, max_workers)
+        # Opcjonalny cache plików adresowany SHA bloba
+        self.cache = BlobCache(cache_dir, cache_max_bytes) if cache_dir else None
+        # Błędy pobierania pojedynczych plików z ostatniego wywołania get_test_files
+        self.fetch_errors: List[Dict[str, str]] = []
+        
+        # Pula połączeń dopasowana do liczby wątków pobierających pliki
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.max_workers)
+        self.gl.session.mount('https://', adapter)
+        self.gl.session.mount('http://', adapter)
         
-    def get_test_files(self, project_id: str, branch: str = "main", test_path: str = "tests/") -> List[Dict]:
+        # Cache obiektów projektów oraz zapytania warunkowe (ETag) dla drzewa i metadanych
+        self._projects = TTLCache(ttl=project_ttl)
+        self.api = ConditionalSession(self.gl.api_url, {'PRIVATE-TOKEN': token}, session=self.gl.session)
+    
+    def _get_project(self, project_id: str) -> Any:
+        """Zwraca obiekt projektu z cache (odświeżany po upływie TTL)"""
+        return self._projects.get_or_create(str(project_id), lambda: self.gl.projects.get(project_id))
+    
+    def _project_path(self, project_id: str) -> str:
+        return f"/projects/{quote(str(project_id), safe='')}"
+        
+    def get_test_files(self, project_id: str, branch: str = "main", test_path: str = "tests/",
+                       max_workers: Optional[int] = None, use_archive: bool = False) -> List[Dict]:
         """Pobiera pliki testowe z GitLab repository"""
+        if use_archive:
+            return self.get_test_files_from_archive(project_id, branch, test_path)
+        
         try:
-            project = self.gl.projects.get(project_id)
+            self.fetch_errors = []
             
-            # Pobieranie zawartości katalogu testów
-            test_files = []
+            # Rekurencyjne przeszukiwanie katalogów (wszystkie strony wyników, zapytania warunkowe)
+            try:
+                items = self.api.get_json_pages(
+                    f"{self._project_path(project_id)}/repository/tree",
+                    {'path': test_path, 'ref': branch, 'recursive': 'true', 'per_page': 100}
+                )
+            except Exception as e:
+                self.fetch_errors.append({'path': test_path, 'error': f"Błąd przeglądania katalogu: {e}"})
+                return []
+            
+            blobs = [item for item in items
+                     if item['type'] == 'blob' and item['path'].endswith(TEST_FILE_SUFFIXES)]
+            
+            # Pliki o niezmienionym SHA pochodzą z cache, API odpytujemy tylko o nowe/zmienione
+            results: Dict[int, Dict] = {}
+            missing = []
+            for index, item in enumerate(blobs):
+                cached = self.cache.get(item['id']) if self.cache else None
+                if cached is not None:
+                    results[index] = {
+                        'name': item['path'],
+                        'content': cached,
+                        'id': item['id'],
+                        'size': len(cached.encode('utf-8'))
+                    }
+                else:
+                    missing.append(index)
+            
+            # Równoległe pobieranie zawartości plików, wyniki w kolejności drzewa
+            if missing:
+                project = self._get_project(project_id)
+                workers = max(1, min(max_workers or self.max_workers, len(missing)))
+                with ThreadPoolExecutor(max_workers=workers) as executor:
+                    futures = {index: executor.submit(self._download_file, project, blobs[index], branch)
+                               for index in missing}
+                
+                for index, future in futures.items():
+                    try:
+                        results[index] = future.result()
+                    except Exception as e:
+                        self.fetch_errors.append({'path': blobs[index]['path'], 'error': str(e)})
+            
+            return [results[index] for index in sorted(results)]
+            
+        except Exception as e:
+            raise Exception(f"Błąd pobierania plików z GitLab: {str(e)}")
+    
+    def _download_file(self, project: Any, item: Dict, branch: str) -> Dict:
+        """Pobiera i dekoduje pojedynczy plik z repository"""
+        file_content = project.files.get(file_path=item['path'], ref=branch)
+        content = base64.b64decode(file_content.content).decode('utf-8')
+        
+        if self.cache:
+            self.cache.put(item['id'], content)
+        
+        return {
+            'name': item['path'],
+            'content': content,
+            'id': item['id'],
+            'size': file_content.size
+        }
+    
+    def get_test_files_from_archive(self, project_id: str, branch: str = "main",
+                                    test_path: str = "tests/") -> List[Dict]:
+        """Pobiera pliki testowe jednym żądaniem jako archiwum tar.gz katalogu testów"""
+        try:
+            project = self._get_project(project_id)
+            self.fetch_errors = []
+            
+            chunks = project.repository_archive(
+                sha=branch, format='tar.gz', path=test_path,
+                streamed=True, iterator=True, chunk_size=64 * 1024
+            )
+            prefix = test_path.strip('/')
             
-            # Rekurencyjne przeszukiwanie katalogów
-            def process_directory(path: str = test_path):
-                try:
-                    items = project.repository_tree(path=path, ref=branch, recursive=True)
+            test_files = []
+            # Rozpakowywanie strumieniowe w pamięci, bez zapisu archiwum na dysk
+            with tarfile.open(fileobj=io.BufferedReader(_ChunkStream(chunks)), mode='r|gz') as archive:
+                for member in archive:
+                    if not member.isfile():
+                        continue
+                    
+                    # Pierwszy element ścieżki to katalog "<projekt>-<ref>-<sha>"
+                    path = member.name.split('/', 1)[-1]
+                    if prefix and not (path == prefix or path.startswith(prefix + '/')):
+                        continue
+                    if not path.endswith(TEST_FILE_SUFFIXES):
+                        continue
+                    
+                    try:
+                        data = archive.extractfile(member).read()
+                        content = data.decode('utf-8')
+                    except Exception as e:
+                        self.fetch_errors.append({'path': path, 'error': str(e)})
+                        continue
+                    
+                    sha = git_blob_sha(data)
+                    if self.cache:
+                        self.cache.put(sha, content)
                     
-                    for item in items:
-                        if item['type'] == 'blob' and item['path'].endswith(('.py', '_test.py', 'test_.py')):
-                            # Pobieranie zawartości pliku
-                            try:
-                                file_content = project.files.get(file_path=item['path'], ref=branch)
-                                content = base64.b64decode(file_content.content).decode('utf-8')
-                                
-                                test_files.append({
-                                    'name': item['path'],
-                                    'content': content,
-                                    'id': item['id'],
-                                    'size': file_content.size
-                                })
-                            except Exception as e:
-                                print(f"Błąd pobierania pliku {item['path']}: {e}")
-                                
-                except Exception as e:
-                    print(f"Błąd przeglądania katalogu {path}: {e}")
-            
-            process_directory()
+                    test_files.append({
+                        'name': path,
+                        'content': content,
+                        'id': sha,
+                        'size': len(data)
+                    })
+            
+            test_files.sort(key=lambda test: test['name'])
             return test_files
             
         except Exception as e:
-            raise Exception(f"Błąd pobierania plików z GitLab: {str(e)}")
+            raise Exception(f"Błąd pobierania archiwum z GitLab: {str(e)}")
     
     def update_file(self, project_id: str, file_path: str, content: str, 
                    commit_message: str, branch: str = "main") -> bool:
         """Aktualizuje plik w repository"""
         try:
-            project = self.gl.projects.get(project_id)
+            project = self._get_project(project_id)
             
             # Sprawdzenie czy plik istnieje
             try:
@@ -71,11 +209,80 @@ class GitLabClient:
         except Exception as e:
             raise Exception(f"Błąd aktualizacji pliku na GitLab: {str(e)}")
     
+    def commit_files(self, project_id: str, files: List[Dict], commit_message: str,
+                     branch: str = "main", start_branch: Optional[str] = None) -> Dict:
+        """Zapisuje wiele plików jednym commitem (API commits z listą akcji).
+        Pliki: {'file_path', 'content', opcjonalnie 'action'} - bez 'action' wybierane jest 'update'
+        dla plików istniejących na gałęzi bazowej i 'create' dla nowych"""
+        try:
+            project = self._get_project(project_id)
+            source_ref = start_branch or branch
+            
+            unresolved = [file['file_path'] for file in files if not file.get('action')]
+            existing = self._existing_files(project_id, project, unresolved, source_ref) if unresolved else set()
+            
+            actions = [{
+                'action': file.get('action') or ('update' if file['file_path'] in existing else 'create'),
+                'file_path': file['file_path'],
+                'content': file['content']
+            } for file in files]
+            
+            commit_data = {
+                'branch': branch,
+                'commit_message': commit_message,
+                'actions': actions
+            }
+            # Utworzenie nowej gałęzi na bazie start_branch w tym samym żądaniu
+            if start_branch and start_branch != branch:
+                commit_data['start_branch'] = start_branch
+            
+            commit = project.commits.create(commit_data)
+            
+            return {
+                'id': commit.id,
+                'web_url': getattr(commit, 'web_url', ''),
+                'branch': branch
+            }
+            
+        except Exception as e:
+            raise Exception(f"Błąd tworzenia commita na GitLab: {str(e)}")
+    
+    def _existing_files(self, project_id: str, project, file_paths: List[str], ref: str) -> set:
+        """Zwraca te z podanych plików, które istnieją na gałęzi (jedno zapytanie o drzewo zamiast zapytania na plik)"""
+        if len(file_paths) == 1:
+            return set(file_paths) if self._file_exists(project, file_paths[0], ref) else set()
+        
+        directory = posixpath.commonpath([posixpath.dirname(path) for path in file_paths])
+        params = {'ref': ref, 'recursive': 'true', 'per_page': 100}
+        if directory:
+            params['path'] = directory
+        try:
+            items = self.api.get_json_pages(f"{self._project_path(project_id)}/repository/tree", params)
+        except requests.exceptions.HTTPError as e:
+            # Katalog nie istnieje na gałęzi - wszystkie pliki są nowe
+            if e.response is not None and e.response.status_code == 404:
+                return set()
+            raise
+        
+        wanted = set(file_paths)
+        return {item['path'] for item in items if item['type'] == 'blob' and item['path'] in wanted}
+    
+    @staticmethod
+    def _file_exists(project, file_path: str, ref: str) -> bool:
+        """Sprawdza istnienie pliku na gałęzi (żądanie HEAD, bez pobierania treści)"""
+        try:
+            project.files.head(file_path, ref=ref)
+            return True
+        except gitlab.exceptions.GitlabHeadError as e:
+            if e.response_code == 404:
+                return False
+            raise
+    
     def create_merge_request(self, project_id: str, title: str, description: str, 
                            source_branch: str, target_branch: str = "main") -> str:
         """Tworzy merge request"""
         try:
-            project = self.gl.projects.get(project_id)
+            project = self._get_project(project_id)
             
             mr_data = {
                 'source_branch': source_branch,
@@ -94,13 +301,13 @@ class GitLabClient:
     def get_project_info(self, project_id: str) -> Dict:
         """Pobiera informacje o projekcie"""
         try:
-            project = self.gl.projects.get(project_id)
+            project = self.api.get_json(self._project_path(project_id))
             return {
-                'id': project.id,
-                'name': project.name,
-                'path': project.path,
-                'web_url': project.web_url,
-                'default_branch': project.default_branch
+                'id': project['id'],
+                'name': project['name'],
+                'path': project['path'],
+                'web_url': project['web_url'],
+                'default_branch': project.get('default_branch')
             }
             
         except Exception as e:
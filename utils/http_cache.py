@@ -0,0 +1,109 @@
+import time
+import threading
+import requests
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+
+class TTLCache:
+    """Cache obiektów z ograniczonym czasem życia wpisów i liczbą wpisów"""
+
+    def __init__(self, ttl: float = 300, max_entries: int = 128):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Any, Tuple[float, Any]]" = OrderedDict()
+
+    def get_or_create(self, key: Any, factory: Callable[[], Any]) -> Any:
+        """Zwraca wpis z cache lub tworzy go przy braku / wygaśnięciu"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[0] > now:
+                self._entries.move_to_end(key)
+                return entry[1]
+
+        value = factory()
+
+        with self._lock:
+            self._entries[key] = (now + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return value
+
+    def invalidate(self, key: Any = None):
+        """Usuwa wpis (lub wszystkie wpisy gdy key jest None)"""
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+
+class ConditionalSession:
+    """Zapytania GET z ETag / If-None-Match - niezmienione dane kosztują odpowiedź 304"""
+
+    def __init__(self, base_url: str, headers: Dict[str, str], session: Optional[requests.Session] = None,
+                 max_entries: int = 1024, timeout: int = 30):
+        self.base_url = base_url.rstrip('/')
+        self.headers = headers
+        self.session = session or requests.Session()
+        self.max_entries = max_entries
+        self.timeout = timeout
+        self.not_modified = 0
+        self.modified = 0
+        self._lock = threading.Lock()
+        # klucz zapytania -> (etag, dane JSON, adres następnej strony)
+        self._entries: "OrderedDict[str, Tuple[str, Any, Optional[str]]]" = OrderedDict()
+
+    def _request(self, url: str, params: Optional[Dict] = None) -> Tuple[Any, Optional[str]]:
+        key = requests.Request('GET', url, params=params).prepare().url
+
+        with self._lock:
+            cached = self._entries.get(key)
+
+        headers = dict(self.headers)
+        if cached:
+            headers['If-None-Match'] = cached[0]
+
+        response = self.session.get(url, params=params, headers=headers, timeout=self.timeout)
+
+        if response.status_code == 304 and cached:
+            with self._lock:
+                self.not_modified += 1
+                self._entries.move_to_end(key)
+            return cached[1], cached[2]
+
+        response.raise_for_status()
+        data = response.json()
+        next_url = response.links.get('next', {}).get('url')
+
+        with self._lock:
+            self.modified += 1
+            etag = response.headers.get('ETag')
+            if etag:
+                self._entries[key] = (etag, data, next_url)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return data, next_url
+
+    def get_json(self, path: str, params: Optional[Dict] = None) -> Any:
+        """Pobiera dokument JSON z API"""
+        data, _ = self._request(f"{self.base_url}{path}", params)
+        return data
+
+    def get_json_pages(self, path: str, params: Optional[Dict] = None) -> List[Any]:
+        """Pobiera wszystkie strony listy z API (nagłówek Link: rel=next)"""
+        items: List[Any] = []
+        data, next_url = self._request(f"{self.base_url}{path}", params)
+        items.extend(data)
+        while next_url:
+            data, next_url = self._request(next_url)
+            items.extend(data)
+        return items
+
+    def stats(self) -> Dict[str, int]:
+        """Zwraca liczbę odpowiedzi 304 i pełnych odpowiedzi"""
+        return {'not_modified': self.not_modified, 'modified': self.modified}
@@ -1,7 +1,11 @@
 import jenkins
 import time
+import codecs
+import json
 import requests
-from typing import Dict, Any, Optional
+from urllib.parse import quote
+from typing import Dict, Any, Optional, Iterator, Callable, Tuple
+from utils.build_log import BuildLog
 
 class JenkinsClient:
     def __init__(self, url: str, username: str, password: str):
@@ -9,6 +13,18 @@ class JenkinsClient:
         self.username = username
         self.password = password
         self.server = jenkins.Jenkins(url, username=username, password=password)
+        # Sesja HTTP dla endpointów nieobsługiwanych przez python-jenkins (np. progressiveText)
+        self.session = requests.Session()
+        self.session.auth = (username, password)
+    
+    def _job_url(self, job_name: str) -> str:
+        """Buduje URL job'a (również w folderach, np. 'folder/job')"""
+        return self.url + ''.join(f"/job/{quote(part)}" for part in job_name.strip('/').split('/'))
+    
+    @staticmethod
+    def _poll_interval(elapsed: float, min_interval: float = 1.0, max_interval: float = 10.0) -> float:
+        """Adaptacyjny odstęp odpytywania - szybko na początku, rzadziej przy długich buildach"""
+        return min(max_interval, max(min_interval, elapsed * 0.1))
         
     def test_connection(self) -> Dict[str, Any]:
         """Testuje połączenie z Jenkins"""
@@ -38,31 +54,44 @@ class JenkinsClient:
         except Exception:
             return False
         
-    def trigger_build(self, job_name: str, parameters: Optional[Dict] = None) -> int:
-        """Uruchamia build Jenkins job'a"""
+    def trigger_build(self, job_name: str, parameters: Optional[Dict] = None, queue_timeout: int = 300) -> int:
+        """Uruchamia build Jenkins job'a i zwraca numer buildu odczytany z elementu kolejki"""
         try:
-            # Sprawdzenie czy job istnieje
-            if not self.job_exists(job_name):
+            # Uruchomienie buildu - Jenkins zwraca numer elementu kolejki
+            try:
+                if parameters:
+                    queue_id = self.server.build_job(job_name, parameters)
+                else:
+                    queue_id = self.server.build_job(job_name)
+            except jenkins.NotFoundException:
                 available_jobs = [job['name'] for job in self.get_all_jobs()]
                 raise Exception(f"Job '{job_name}' nie istnieje. Dostępne job'y: {available_jobs[:10]}")
             
-            # Pobranie informacji o job'ie
-            job_info = self.server.get_job_info(job_name)
-            next_build_number = job_info.get('nextBuildNumber', 1)
-            
-            # Uruchomienie buildu
-            if parameters:
-                self.server.build_job(job_name, parameters)
-            else:
-                self.server.build_job(job_name)
-            
-            return next_build_number
+            return self.wait_for_queue_item(queue_id, queue_timeout)
             
         except jenkins.JenkinsException as e:
             raise Exception(f"Błąd Jenkins API: {str(e)}")
         except Exception as e:
             raise Exception(f"Błąd uruchamiania job'a '{job_name}': {str(e)}")
     
+    def wait_for_queue_item(self, queue_id: int, timeout: int = 300) -> int:
+        """Oczekuje aż element kolejki otrzyma executor i zwraca numer utworzonego buildu"""
+        start_time = time.time()
+        
+        while time.time() - start_time < timeout:
+            item = self.server.get_queue_item(queue_id)
+            
+            if item.get('cancelled'):
+                raise Exception(f"Element kolejki #{queue_id} został anulowany")
+            
+            executable = item.get('executable')
+            if executable and executable.get('number') is not None:
+                return executable['number']
+            
+            time.sleep(self._poll_interval(time.time() - start_time, min_interval=0.5))
+        
+        raise Exception(f"Timeout ({timeout}s) oczekiwania na rozpoczęcie buildu z kolejki #{queue_id}")
+    
     def wait_for_build(self, job_name: str, build_number: int, timeout: int = 300) -> str:
         """Oczekuje na zakończenie buildu"""
         try:
@@ -80,23 +109,102 @@ class JenkinsClient:
                         return result
                     
                     print(f"Build #{build_number} nadal trwa...")
-                    time.sleep(10)  # Czeka 10 sekund przed kolejnym sprawdzeniem
                     
                 except jenkins.NotFoundException:
-                    # Build jeszcze nie istnieje - czeka krócej
+                    # Build jeszcze nie istnieje
                     print(f"Build #{build_number} jeszcze nie rozpoczęty...")
-                    time.sleep(5)
-                    continue
                 except Exception as e:
                     print(f"Błąd sprawdzania statusu buildu: {e}")
-                    time.sleep(5)
-                    continue
+                
+                time.sleep(self._poll_interval(time.time() - start_time))
             
             raise Exception(f"Timeout ({timeout}s) oczekiwania na build #{build_number}")
             
         except Exception as e:
             raise Exception(f"Błąd oczekiwania na build: {str(e)}")
     
+    def follow_build_logs(self, job_name: str, build_number: int, timeout: int = 300) -> Iterator[str]:
+        """Śledzi konsolę buildu przyrostowo (progressiveText), zwracając kolejne fragmenty logów"""
+        url = f"{self._job_url(job_name)}/{build_number}/logText/progressiveText"
+        decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+        start_time = time.time()
+        offset = 0
+        
+        while time.time() - start_time < timeout:
+            try:
+                response = self.session.get(url, params={'start': offset}, timeout=30)
+            except requests.exceptions.RequestException as e:
+                print(f"Błąd pobierania logów buildu: {e}")
+                time.sleep(self._poll_interval(time.time() - start_time))
+                continue
+            
+            if response.status_code == 404:
+                # Build jeszcze nie istnieje (czeka w kolejce)
+                time.sleep(self._poll_interval(time.time() - start_time))
+                continue
+            response.raise_for_status()
+            
+            chunk = decoder.decode(response.content)
+            offset = int(response.headers.get('X-Text-Size', offset + len(response.content)))
+            if chunk:
+                yield chunk
+            
+            # Brak nagłówka X-More-Data oznacza koniec konsoli (build zakończony)
+            if response.headers.get('X-More-Data', '').lower() != 'true':
+                tail = decoder.decode(b'', final=True)
+                if tail:
+                    yield tail
+                return
+            
+            time.sleep(self._poll_interval(time.time() - start_time))
+        
+        raise Exception(f"Timeout ({timeout}s) oczekiwania na build #{build_number}")
+    
+    def wait_for_build_with_logs(self, job_name: str, build_number: int, timeout: int = 300,
+                                 on_log: Optional[Callable[[str], None]] = None) -> Tuple[str, BuildLog]:
+        """Oczekuje na zakończenie buildu, składając logi na bieżąco - zwraca (status, log buildu)"""
+        try:
+            start_time = time.time()
+            log = BuildLog()
+            
+            for chunk in self.follow_build_logs(job_name, build_number, timeout):
+                log.append(chunk)
+                if on_log:
+                    on_log(chunk)
+            
+            # Konsola zamknięta - status jest zwykle dostępny od razu
+            remaining = max(1, int(timeout - (time.time() - start_time)))
+            status = self.wait_for_build(job_name, build_number, remaining)
+            
+            return status, log
+            
+        except Exception as e:
+            raise Exception(f"Błąd śledzenia buildu: {str(e)}")
+    
+    def get_build_artifact(self, job_name: str, build_number: int, relative_path: str) -> Optional[bytes]:
+        """Pobiera zarchiwizowany artefakt buildu (None gdy nie istnieje)"""
+        try:
+            url = f"{self._job_url(job_name)}/{build_number}/artifact/{quote(relative_path)}"
+            response = self.session.get(url, timeout=60)
+            if response.status_code == 404:
+                return None
+            response.raise_for_status()
+            return response.content
+            
+        except Exception as e:
+            raise Exception(f"Błąd pobierania artefaktu '{relative_path}' z build #{build_number}: {str(e)}")
+    
+    def get_json_report(self, job_name: str, build_number: int,
+                        relative_path: str = "test_workspace/test_results.json") -> Optional[Dict[str, Any]]:
+        """Pobiera raport pytest-json-report zarchiwizowany przez build"""
+        data = self.get_build_artifact(job_name, build_number, relative_path)
+        if data is None:
+            return None
+        try:
+            return json.loads(data)
+        except json.JSONDecodeError as e:
+            raise Exception(f"Błąd parsowania raportu JSON z build #{build_number}: {str(e)}")
+    
     def get_build_logs(self, job_name: str, build_number: int) -> str:
         """Pobiera logi z buildu"""
         try:
@@ -1,42 +1,185 @@
 import requests
 import json
-from typing import Optional
+from requests.adapters import HTTPAdapter
+from typing import Optional, Iterator, Union, Dict, Any, List
+from utils.response_cache import ResponseCache
 
 class OllamaClient:
-    def __init__(self, host: str = "http://localhost:11434", model: str = "gemma2:7b"):
+    def __init__(self, host: str = "http://localhost:11434", model: str = "gemma2:7b",
+                 keep_alive: Optional[Union[str, int]] = "30m", pool_size: int = 8,
+                 cache: Optional[ResponseCache] = None, embed_model: str = "nomic-embed-text"):
         self.host = host.rstrip('/')
         self.model = model
+        # Model używany do embeddingów (wyszukiwanie podobnych awarii)
+        self.embed_model = embed_model
+        # Czas utrzymania modelu w pamięci po ostatnim zapytaniu (np. "30m", -1 = bez limitu)
+        self.keep_alive = keep_alive
+        # Opcjonalny cache odpowiedzi dla identycznych promptów
+        self.cache = cache
+        # Czy serwer przyjmuje schemat JSON w polu format (Ollama >= 0.5) - wyłączane po pierwszym odrzuceniu
+        self.supports_schema_format = True
         
-    def generate(self, prompt: str, system_prompt: Optional[str] = None) -> str:
-        """Generuje odpowiedź używając modelu Ollama"""
+        # Wspólna sesja z pulą połączeń keep-alive
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+    
+    def _request_data(self, **fields) -> dict:
+        """Buduje treść zapytania z modelem i ustawieniem keep_alive"""
+        data = {"model": self.model}
+        if self.keep_alive is not None:
+            data["keep_alive"] = self.keep_alive
+        data.update(fields)
+        return data
+        
+    def _cache_key(self, prompt: str, system_prompt: Optional[str], options: Optional[Dict[str, Any]],
+                   response_format: Optional[Union[str, Dict[str, Any]]] = None) -> Optional[str]:
+        if self.cache is None:
+            return None
+        return ResponseCache.make_key(self.model, system_prompt, prompt, options, response_format)
+    
+    def _post_generate(self, url: str, data: dict, **kwargs) -> requests.Response:
+        """Wysyła zapytanie generowania; gdy Ollama < 0.5 odrzuci schemat w polu format (HTTP 400), ponawia z "json\""""
+        if isinstance(data.get("format"), dict) and not self.supports_schema_format:
+            data = dict(data, format="json")
+        
+        response = self.session.post(url, json=data, **kwargs)
+        if response.status_code == 400 and isinstance(data.get("format"), dict):
+            response.close()
+            self.supports_schema_format = False
+            response = self.session.post(url, json=dict(data, format="json"), **kwargs)
+        return response
+    
+    def generate(self, prompt: str, system_prompt: Optional[str] = None,
+                 options: Optional[Dict[str, Any]] = None,
+                 response_format: Optional[Union[str, Dict[str, Any]]] = None) -> str:
+        """Generuje odpowiedź używając modelu Ollama (response_format: "json" lub schemat JSON)"""
         try:
+            cache_key = self._cache_key(prompt, system_prompt, options, response_format)
+            if cache_key:
+                cached = self.cache.get(cache_key)
+                if cached is not None:
+                    return cached
+            
             url = f"{self.host}/api/generate"
             
-            data = {
-                "model": self.model,
-                "prompt": prompt,
-                "stream": False
-            }
+            data = self._request_data(prompt=prompt, stream=False)
             
             if system_prompt:
                 data["system"] = system_prompt
+            if options:
+                data["options"] = options
+            if response_format:
+                # Ollama ogranicza wyjście do poprawnego JSON (lub JSON zgodnego ze schematem)
+                data["format"] = response_format
             
-            response = requests.post(url, json=data, timeout=300)
+            response = self._post_generate(url, data, timeout=300)
             response.raise_for_status()
             
             result = response.json()
-            return result.get('response', '')
+            text = result.get('response', '')
+            
+            if cache_key and result.get('done', True):
+                self.cache.put(cache_key, text)
+            
+            return text
             
         except requests.exceptions.RequestException as e:
             raise Exception(f"Błąd komunikacji z Ollama: {str(e)}")
         except json.JSONDecodeError as e:
             raise Exception(f"Błąd parsowania odpowiedzi Ollama: {str(e)}")
     
+    def generate_stream(self, prompt: str, system_prompt: Optional[str] = None,
+                        options: Optional[Dict[str, Any]] = None,
+                        response_format: Optional[Union[str, Dict[str, Any]]] = None) -> Iterator[str]:
+        """Generuje odpowiedź strumieniowo, zwracając kolejne tokeny (zamknięcie generatora przerywa generowanie)"""
+        cache_key = self._cache_key(prompt, system_prompt, options, response_format)
+        if cache_key:
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                yield cached
+                return
+        
+        url = f"{self.host}/api/generate"
+        
+        data = self._request_data(prompt=prompt, stream=True)
+        
+        if system_prompt:
+            data["system"] = system_prompt
+        if options:
+            data["options"] = options
+        if response_format:
+            # Ollama ogranicza wyjście do poprawnego JSON (lub JSON zgodnego ze schematem)
+            data["format"] = response_format
+        
+        try:
+            response = self._post_generate(url, data, stream=True, timeout=(10, 300))
+            response.raise_for_status()
+        except requests.exceptions.RequestException as e:
+            raise Exception(f"Błąd komunikacji z Ollama: {str(e)}")
+        
+        # Zamknięcie połączenia (także przy przerwaniu) zatrzymuje generowanie po stronie Ollama
+        tokens = []
+        try:
+            for line in response.iter_lines():
+                if not line:
+                    continue
+                chunk = json.loads(line)
+                if chunk.get('error'):
+                    raise Exception(f"Błąd Ollama: {chunk['error']}")
+                token = chunk.get('response', '')
+                if token:
+                    tokens.append(token)
+                    yield token
+                if chunk.get('done'):
+                    # Do cache trafiają tylko kompletne (nieprzerwane) odpowiedzi
+                    if cache_key:
+                        self.cache.put(cache_key, ''.join(tokens))
+                    break
+        except requests.exceptions.RequestException as e:
+            raise Exception(f"Błąd komunikacji z Ollama: {str(e)}")
+        except json.JSONDecodeError as e:
+            raise Exception(f"Błąd parsowania odpowiedzi Ollama: {str(e)}")
+        finally:
+            response.close()
+    
+    def embed(self, text: str, model: Optional[str] = None) -> List[float]:
+        """Zwraca wektor embeddingu tekstu"""
+        try:
+            url = f"{self.host}/api/embeddings"
+            data = {"model": model or self.embed_model, "prompt": text}
+            if self.keep_alive is not None:
+                data["keep_alive"] = self.keep_alive
+            
+            response = self.session.post(url, json=data, timeout=120)
+            response.raise_for_status()
+            
+            embedding = response.json().get('embedding')
+            if not embedding:
+                raise Exception("brak wektora w odpowiedzi")
+            return embedding
+            
+        except Exception as e:
+            raise Exception(f"Błąd generowania embeddingu: {str(e)}")
+    
+    def warm_up(self) -> bool:
+        """Ładuje model do pamięci (zapytanie bez promptu), aby pierwsze użycie nie czekało na załadowanie"""
+        try:
+            url = f"{self.host}/api/generate"
+            response = self.session.post(url, json=self._request_data(), timeout=600)
+            response.raise_for_status()
+            
+            return True
+            
+        except Exception as e:
+            raise Exception(f"Błąd ładowania modelu: {str(e)}")
+    
     def check_model_availability(self) -> bool:
         """Sprawdza czy model jest dostępny"""
         try:
             url = f"{self.host}/api/tags"
-            response = requests.get(url, timeout=30)
+            response = self.session.get(url, timeout=30)
             response.raise_for_status()
             
             models = response.json().get('models', [])
@@ -51,7 +194,7 @@ class OllamaClient:
             url = f"{self.host}/api/pull"
             data = {"name": self.model}
             
-            response = requests.post(url, json=data, timeout=600)
+            response = self.session.post(url, json=data, timeout=600)
             response.raise_for_status()
             
             return True
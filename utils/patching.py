@@ -0,0 +1,129 @@
+import re
+from typing import List, Optional, Tuple
+
+# Nagłówek hunka, np. "@@ -12,7 +12,8 @@" (numery linii bywają pominięte lub błędne w odpowiedziach modelu)
+HUNK_RE = re.compile(r'^@@(?: -(\d+)(?:,\d+)? \+\d+(?:,\d+)?)? @@')
+
+
+class PatchError(Exception):
+    """Diff nie pasuje do pliku lub ma niepoprawny format"""
+
+
+def _strip_fences(diff: str) -> str:
+    """Usuwa obramowanie ```diff ... ``` dodawane przez modele"""
+    lines = diff.strip('\n').split('\n')
+    if lines and lines[0].startswith('```'):
+        lines = lines[1:]
+        if lines and lines[-1].strip().startswith('```'):
+            lines = lines[:-1]
+    return '\n'.join(lines)
+
+
+def parse_hunks(diff: str) -> List[Tuple[Optional[int], List[Tuple[str, str]]]]:
+    """Zwraca listę hunków (linia startowa lub None, operacje (' ' / '-' / '+', tekst linii))"""
+    hunks = []
+    current = None
+
+    for line in _strip_fences(diff).split('\n'):
+        match = HUNK_RE.match(line)
+        if match:
+            current = (int(match.group(1)) if match.group(1) else None, [])
+            hunks.append(current)
+            continue
+        if current is None or line.startswith(('--- ', '+++ ', '\\')):
+            # Nagłówki plików i "\ No newline at end of file"
+            continue
+
+        if line.startswith(('-', '+')):
+            current[1].append((line[0], line[1:]))
+        else:
+            # Linia kontekstu (modele często gubią spację na początku pustych linii)
+            current[1].append((' ', line[1:] if line.startswith(' ') else line))
+
+    # Puste linie kontekstu na końcu hunka to zwykle artefakt formatowania
+    for _, operations in hunks:
+        while operations and operations[-1] == (' ', ''):
+            operations.pop()
+
+    hunks = [hunk for hunk in hunks if any(tag != ' ' for tag, _ in hunk[1])]
+    if not hunks:
+        raise PatchError("Diff nie zawiera zmian")
+    return hunks
+
+
+def _indent(text: str) -> str:
+    return text[:len(text) - len(text.lstrip())]
+
+
+def _find_block(lines: List[str], block: List[str], expected: int, start: int) -> Tuple[Optional[int], bool]:
+    """Szuka bloku linii zaczynając od oczekiwanej pozycji; zwraca (pozycja, czy dopasowanie bez białych znaków)"""
+    limit = len(lines) - len(block)
+    if limit < start:
+        return None, False
+    expected = min(max(expected, start), limit)
+
+    for fuzzy in (False, True):
+        normalize = (lambda text: text.strip()) if fuzzy else (lambda text: text)
+        wanted = [normalize(text) for text in block]
+        for distance in range(0, limit - start + 1):
+            for position in (expected - distance, expected + distance):
+                if start <= position <= limit and \
+                        all(normalize(lines[position + i]) == wanted[i] for i in range(len(block))):
+                    return position, fuzzy
+    return None, False
+
+
+def _rebuild_block(original: List[str], operations: List[Tuple[str, str]], fuzzy: bool) -> List[str]:
+    """Buduje nową treść bloku - linie kontekstu z oryginału, dodane linie z wcięciem dopasowanym do pliku"""
+    # Pary (wcięcie w diffie, wcięcie w pliku) dla linii kontekstu / usuwanych - wg kolejności w hunku
+    references: List[Tuple[int, str, str]] = []
+    index = 0
+    for position, (tag, text) in enumerate(operations):
+        if tag != '+':
+            references.append((position, _indent(text), _indent(original[index])))
+            index += 1
+
+    result = []
+    index = 0
+    for position, (tag, text) in enumerate(operations):
+        if tag == ' ':
+            result.append(original[index])
+            index += 1
+        elif tag == '-':
+            index += 1
+        elif not fuzzy or not references:
+            result.append(text)
+        else:
+            # Najbliższa wcześniejsza linia oryginału (lub pierwsza późniejsza) wyznacza przesunięcie wcięcia
+            previous = [reference for reference in references if reference[0] < position]
+            _, diff_indent, file_indent = previous[-1] if previous else references[0]
+            if text.strip() and text.startswith(diff_indent):
+                text = file_indent + text[len(diff_indent):]
+            result.append(text)
+    return result
+
+
+def apply_unified_diff(original: str, diff: str) -> str:
+    """Nakłada unified diff na tekst pliku, dopuszczając przesunięcia numerów linii i różnice w białych znakach"""
+    lines = original.split('\n')
+    offset = 0
+    position = 0
+
+    for number, (start_line, operations) in enumerate(parse_hunks(diff), 1):
+        old = [text for tag, text in operations if tag != '+']
+        if not old:
+            # Hunk bez kontekstu - dopisanie w podanym miejscu (lub na końcu pliku)
+            at = min(max(start_line - 1 + offset, 0), len(lines)) if start_line is not None else len(lines)
+            fuzzy = False
+        else:
+            expected = start_line - 1 + offset if start_line else position
+            at, fuzzy = _find_block(lines, old, expected, position)
+            if at is None:
+                raise PatchError(f"Hunk {number} nie pasuje do pliku")
+
+        new = _rebuild_block(lines[at:at + len(old)], operations, fuzzy)
+        lines[at:at + len(old)] = new
+        offset += len(new) - len(old)
+        position = at + len(new)
+
+    return '\n'.join(lines)
@@ -0,0 +1,62 @@
+import re
+from typing import Dict, Iterable, List
+
+# Ścieżka pliku Python w dowolnym tekście (node ID, traceback, opis błędu)
+PY_PATH_RE = re.compile(r'[\w.\-/\\]*\w\.py\b')
+
+
+def _split_path(path: str) -> List[str]:
+    return [part for part in path.replace('\\', '/').split('/') if part and part != '.']
+
+
+class TestFileIndex:
+    """Indeks pobranych plików testowych po sufiksach ścieżek (node ID / traceback -> rekord testu)"""
+
+    def __init__(self, tests: List[Dict]):
+        self.tests = tests
+        self._order = {test['name']: position for position, test in enumerate(tests)}
+        self._by_suffix: Dict[str, List[Dict]] = {}
+
+        for test in tests:
+            parts = _split_path(test['name'])
+            for start in range(len(parts)):
+                self._by_suffix.setdefault('/'.join(parts[start:]), []).append(test)
+
+    def lookup(self, path: str) -> List[Dict]:
+        """Zwraca testy o najdłuższym wspólnym sufiksie ścieżki (np. ścieżka absolutna z workspace Jenkins)"""
+        parts = _split_path(path.split('::', 1)[0])
+        for start in range(len(parts)):
+            found = self._by_suffix.get('/'.join(parts[start:]))
+            if found:
+                return found
+        return []
+
+    def lookup_location(self, location: str) -> List[Dict]:
+        """Jak lookup, dla lokalizacji w formacie 'ścieżka:linia'"""
+        path, _, line = location.rpartition(':')
+        return self.lookup(path if path and line.isdigit() else location)
+
+    def match_text(self, text: str) -> List[Dict]:
+        """Znajduje testy, których ścieżki występują w dowolnym tekście (np. błędy opisane przez AI)"""
+        found: List[Dict] = []
+        for path in PY_PATH_RE.findall(text):
+            matches = self.lookup(path)
+            # Sama nazwa pliku pasująca do wielu testów jest niejednoznaczna
+            if len(matches) == 1 or (matches and '/' in path.replace('\\', '/')):
+                found.extend(matches)
+        return found
+
+    def select(self, nodeids: Iterable[str] = (), locations: Iterable[str] = (),
+               texts: Iterable[str] = ()) -> List[Dict]:
+        """Zwraca testy wskazane przez node ID, lokalizacje z tracebacków i teksty - w kolejności testów"""
+        selected: Dict[str, Dict] = {}
+        for nodeid in nodeids:
+            for test in self.lookup(nodeid):
+                selected[test['name']] = test
+        for location in locations:
+            for test in self.lookup_location(location):
+                selected[test['name']] = test
+        for text in texts:
+            for test in self.match_text(text):
+                selected[test['name']] = test
+        return sorted(selected.values(), key=lambda test: self._order[test['name']])
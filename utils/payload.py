@@ -0,0 +1,34 @@
+import json
+import gzip
+import base64
+from typing import Dict, Iterable, List, Optional, Tuple
+from utils.blob_cache import git_blob_sha
+
+# Prefiks skompresowanego formatu TESTS_DATA (bez prefiksu job traktuje dane jako zwykłą listę JSON)
+PAYLOAD_PREFIX = 'gz64:'
+# Obsługiwane formaty TESTS_DATA: zwykła lista JSON (domyślny) i skompresowany gz64
+PAYLOAD_FORMATS = ('json', 'gz64')
+PAYLOAD_VERSION = 2
+# Znacznik w logach job'a, gdy w workspace brakuje plików przesłanych tylko jako hash
+MISSING_BLOBS_MARKER = 'MISSING_BLOBS:'
+
+
+def encode_tests_payload(tests: List[Dict], known_hashes: Optional[Iterable[str]] = None) -> Tuple[str, List[str]]:
+    """Koduje testy do parametru TESTS_DATA (gzip + base64), pomijając treść plików znanych job'owi"""
+    known = set(known_hashes or ())
+    files = []
+    hashes = []
+
+    for test in tests:
+        sha = git_blob_sha(test['content'].encode('utf-8'))
+        entry = {'name': test['name'], 'sha': sha}
+        # Plik o tym samym hashu jest już w magazynie job'a - wystarczy referencja
+        if sha not in known:
+            entry['content'] = test['content']
+        files.append(entry)
+        hashes.append(sha)
+
+    document = json.dumps({'version': PAYLOAD_VERSION, 'files': files}, separators=(',', ':'))
+    compressed = gzip.compress(document.encode('utf-8'), compresslevel=9)
+    return PAYLOAD_PREFIX + base64.b64encode(compressed).decode('ascii'), hashes
+
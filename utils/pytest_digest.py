@@ -0,0 +1,304 @@
+import re
+import xml.etree.ElementTree as ET
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+# Nagłówek sekcji pytest, np. "==== FAILURES ====" lub "==== 1 failed, 2 passed in 0.1s ===="
+SECTION_RE = re.compile(r'^={3,} ?(.*?) ?={3,}$')
+# Podsekcja wyjścia, np. "---- Captured stdout call ----" - kończy istotną część tracebacku
+SUBSECTION_RE = re.compile(r'^-{2,} .* -{2,}$')
+# Nagłówek pojedynczego niepowodzenia, np. "____ test_login ____"
+BLOCK_RE = re.compile(r'^_{3,} (.+?) _{3,}$')
+# Wpis w "short test summary info", np. "FAILED tests/test_a.py::test_a - assert 1 == 2"
+SHORT_SUMMARY_RE = re.compile(r'^(FAILED|ERROR) (\S+)(?: - (.*))?$')
+# Wynik testu w trybie -v, np. "tests/test_a.py::test_a FAILED  [ 50%]"
+VERBOSE_RESULT_RE = re.compile(r'^(\S+::\S+) (FAILED|ERROR)\b')
+# Liczniki w linii podsumowania, np. "1 failed", "3 passed", "2 errors"
+COUNT_RE = re.compile(r'(\d+) (passed|failed|errors?|skipped|xfailed|xpassed|warnings?|deselected)')
+# Lokalizacja w traceback, np. "tests/test_a.py:12: in test_a" lub 'File "tests/a.py", line 3'
+LOCATION_RE = re.compile(r'^(\S+\.py):(\d+):|File "([^"]+\.py)", line (\d+)')
+
+MAX_BLOCK_LINES = 40
+
+
+def _normalize(text: str) -> str:
+    """Usuwa zmienne elementy (adresy, liczby) przy porównywaniu tracebacków"""
+    text = re.sub(r'0x[0-9a-fA-F]+', '0x?', text)
+    return re.sub(r'\d+', '?', text)
+
+
+def _trim_block(lines: List[str]) -> List[str]:
+    """Skraca długi traceback zostawiając początek i koniec (tam jest asercja)"""
+    if len(lines) <= MAX_BLOCK_LINES:
+        return lines
+    head = MAX_BLOCK_LINES // 4
+    tail = MAX_BLOCK_LINES - head
+    return lines[:head] + [f"... ({len(lines) - MAX_BLOCK_LINES} linii pominięto) ..."] + lines[-tail:]
+
+
+def build_failure_digest(lines: Iterable[str]) -> Dict[str, Any]:
+    """Buduje zwięzłe podsumowanie niepowodzeń z wyjścia pytest (czytanego linia po linii)"""
+    counts: Dict[str, int] = {}
+    summary_lines: List[str] = []
+    failed: List[str] = []
+    failed_seen = set()
+    messages: Dict[str, str] = {}
+    tracebacks: Dict[str, Dict[str, Any]] = {}
+    assertions: Dict[str, int] = {}
+    locations: List[str] = []
+    locations_seen = set()
+
+    section = ''
+    block_name = None
+    block_lines: List[str] = []
+
+    def add_failed(nodeid: str):
+        if nodeid not in failed_seen:
+            failed_seen.add(nodeid)
+            failed.append(nodeid)
+
+    def close_block():
+        if block_name is None or not block_lines:
+            return
+        trimmed = _trim_block(block_lines)
+        signature = _normalize('\n'.join(line for line in trimmed if not line.startswith('_')))
+        entry = tracebacks.setdefault(signature, {'tests': [], 'text': '\n'.join(trimmed)})
+        entry['tests'].append(block_name)
+
+    for raw_line in lines:
+        line = raw_line.rstrip('\r\n')
+
+        section_match = SECTION_RE.match(line)
+        if section_match:
+            close_block()
+            block_name, block_lines = None, []
+            section = section_match.group(1).lower()
+
+            found = COUNT_RE.findall(section)
+            if found and ' in ' in section:
+                # Linia podsumowania - przy wielu shardach liczniki są sumowane
+                summary_lines.append(section_match.group(1))
+                for number, kind in found:
+                    kind = {'errors': 'error', 'warnings': 'warning'}.get(kind, kind)
+                    counts[kind] = counts.get(kind, 0) + int(number)
+            continue
+
+        if section in ('failures', 'errors'):
+            block_match = BLOCK_RE.match(line)
+            if block_match:
+                close_block()
+                block_name, block_lines = block_match.group(1), []
+                continue
+            if SUBSECTION_RE.match(line):
+                close_block()
+                block_name, block_lines = None, []
+                continue
+            if block_name is not None:
+                block_lines.append(line)
+
+        location_match = LOCATION_RE.search(line)
+        if location_match and section in ('failures', 'errors'):
+            path = location_match.group(1) or location_match.group(3)
+            number = location_match.group(2) or location_match.group(4)
+            location = f"{path}:{number}"
+            if location not in locations_seen and '/site-packages/' not in path:
+                locations_seen.add(location)
+                locations.append(location)
+
+        if line.startswith('E ') and section in ('failures', 'errors'):
+            assertion = line[1:].strip()
+            if assertion:
+                assertions[assertion] = assertions.get(assertion, 0) + 1
+            continue
+
+        summary_match = SHORT_SUMMARY_RE.match(line)
+        if summary_match:
+            add_failed(summary_match.group(2))
+            if summary_match.group(3):
+                messages[summary_match.group(2)] = summary_match.group(3)
+            continue
+
+        verbose_match = VERBOSE_RESULT_RE.match(line)
+        if verbose_match:
+            add_failed(verbose_match.group(1))
+
+    close_block()
+
+    return {
+        'counts': counts,
+        'summary_lines': summary_lines,
+        'failed': failed,
+        'messages': messages,
+        'tracebacks': list(tracebacks.values()),
+        'assertions': [{'line': line, 'count': count} for line, count in assertions.items()],
+        'locations': locations
+    }
+
+
+def has_failure_details(digest: Dict[str, Any]) -> bool:
+    """Czy digest zawiera rozpoznane wyniki pytest"""
+    return bool(digest['counts'] or digest['failed'] or digest['tracebacks'])
+
+
+def format_failure_digest(digest: Dict[str, Any], max_chars: Optional[int] = 12000) -> str:
+    """Formatuje digest jako tekst do promptu modelu"""
+    parts = []
+
+    if digest['summary_lines']:
+        parts.append("Podsumowanie pytest: " + " | ".join(digest['summary_lines']))
+    if digest['counts']:
+        parts.append("Liczniki: " + ", ".join(f"{kind}={count}" for kind, count in sorted(digest['counts'].items())))
+
+    if digest['failed']:
+        parts.append(f"Niepowodzenia ({len(digest['failed'])}):")
+        for nodeid in digest['failed']:
+            message = digest['messages'].get(nodeid)
+            parts.append(f"- {nodeid}" + (f" - {message}" if message else ""))
+
+    if digest['assertions']:
+        parts.append("Linie asercji / wyjątków:")
+        for assertion in digest['assertions']:
+            suffix = f" (x{assertion['count']})" if assertion['count'] > 1 else ""
+            parts.append(f"E {assertion['line']}{suffix}")
+
+    if digest['tracebacks']:
+        parts.append(f"Unikalne tracebacki ({len(digest['tracebacks'])}):")
+        for traceback in digest['tracebacks']:
+            tests = ", ".join(traceback['tests'][:5])
+            if len(traceback['tests']) > 5:
+                tests += f" (+{len(traceback['tests']) - 5})"
+            parts.append(f"--- {tests} ---\n{traceback['text']}")
+
+    text = "\n".join(parts)
+    if max_chars is not None and len(text) > max_chars:
+        text = text[:max_chars] + "\n... (digest skrócony)"
+    return text
+
+
+def parse_json_report(report: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Zamienia raport pytest-json-report na listę wyników testów (outcome, duration, longrepr)"""
+    results = []
+    for test in report.get('tests', []):
+        duration = 0.0
+        longrepr = ''
+        for phase in ('setup', 'call', 'teardown'):
+            stage = test.get(phase) or {}
+            duration += stage.get('duration', 0) or 0
+            if not longrepr and stage.get('longrepr'):
+                longrepr = stage['longrepr']
+        results.append({
+            'nodeid': test.get('nodeid', ''),
+            'outcome': test.get('outcome', 'unknown'),
+            'duration': duration,
+            'longrepr': longrepr
+        })
+    return results
+
+
+def parse_junit_xml(xml_text: str) -> List[Dict[str, Any]]:
+    """Zamienia raport JUnit XML pytest (junit_family=xunit1) na listę wyników testów jak parse_json_report"""
+    results = []
+    for case in ET.fromstring(xml_text).iter('testcase'):
+        file_name = case.get('file') or ''
+        name = case.get('name', '')
+        classname = case.get('classname', '')
+        module = file_name[:-3].replace('/', '.') if file_name.endswith('.py') else ''
+
+        nodeid = f"{file_name}::{name}" if file_name else f"{classname}::{name}"
+        if module and classname.startswith(module + '.'):
+            # Test w klasie - classname zawiera moduł i nazwę klasy
+            nodeid = f"{file_name}::{classname[len(module) + 1:]}::{name}"
+
+        outcome, longrepr = 'passed', ''
+        for child in case:
+            if child.tag in ('failure', 'error'):
+                outcome = 'failed' if child.tag == 'failure' else 'error'
+                longrepr = child.text or child.get('message', '')
+                break
+            if child.tag == 'skipped':
+                outcome = 'skipped'
+
+        results.append({
+            'nodeid': nodeid,
+            'outcome': outcome,
+            'duration': float(case.get('time') or 0),
+            'longrepr': longrepr
+        })
+    return results
+
+
+def summarize_results(results: List[Dict[str, Any]]) -> Dict[str, int]:
+    """Liczy wyniki testów według outcome"""
+    counts: Dict[str, int] = {}
+    for result in results:
+        counts[result['outcome']] = counts.get(result['outcome'], 0) + 1
+    return counts
+
+
+def digest_from_results(results: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Buduje digest niepowodzeń z ustrukturyzowanych wyników testów (bez parsowania konsoli)"""
+    counts = summarize_results(results)
+    failed: List[str] = []
+    messages: Dict[str, str] = {}
+    tracebacks: Dict[str, Dict[str, Any]] = {}
+    assertions: Dict[str, int] = {}
+    locations: List[str] = []
+
+    for result in results:
+        if result['outcome'] not in ('failed', 'error'):
+            continue
+        failed.append(result['nodeid'])
+        lines = result['longrepr'].splitlines()
+
+        for line in lines:
+            if line.startswith('E '):
+                assertion = line[1:].strip()
+                if assertion:
+                    assertions[assertion] = assertions.get(assertion, 0) + 1
+                    messages.setdefault(result['nodeid'], assertion)
+            location_match = LOCATION_RE.search(line)
+            if location_match:
+                path = location_match.group(1) or location_match.group(3)
+                location = f"{path}:{location_match.group(2) or location_match.group(4)}"
+                if location not in locations and '/site-packages/' not in path:
+                    locations.append(location)
+
+        if lines:
+            trimmed = _trim_block(lines)
+            entry = tracebacks.setdefault(_normalize('\n'.join(trimmed)), {'tests': [], 'text': '\n'.join(trimmed)})
+            entry['tests'].append(result['nodeid'].split('::')[-1])
+
+    return {
+        'counts': counts,
+        'summary_lines': [", ".join(f"{count} {outcome}" for outcome, count in sorted(counts.items()))] if counts else [],
+        'failed': failed,
+        'messages': messages,
+        'tracebacks': list(tracebacks.values()),
+        'assertions': [{'line': line, 'count': count} for line, count in assertions.items()],
+        'locations': locations
+    }
+
+
+def _is_boundary(line: str) -> bool:
+    """Czy linia rozpoczyna nową sekcję logu (sekcja pytest, niepowodzenie, traceback z digestu)"""
+    return bool(SECTION_RE.match(line) or BLOCK_RE.match(line)
+                or (line.startswith('--- ') and line.endswith(' ---')))
+
+
+def split_log_sections(lines: Iterable[str], max_chars: int) -> Iterator[str]:
+    """Dzieli log na fragmenty do max_chars znaków, tnąc preferencyjnie na granicach sekcji"""
+    chunk: List[str] = []
+    size = 0
+
+    for raw_line in lines:
+        line = raw_line.rstrip('\r\n')[:max_chars]
+
+        # Na granicy sekcji zamykamy fragment, jeśli jest już co najmniej w połowie pełny
+        if chunk and (size + len(line) + 1 > max_chars or (_is_boundary(line) and size >= max_chars // 2)):
+            yield '\n'.join(chunk)
+            chunk, size = [], 0
+
+        chunk.append(line)
+        size += len(line) + 1
+
+    if chunk:
+        yield '\n'.join(chunk)
@@ -0,0 +1,101 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from typing import Any, Dict, Optional, Union
+
+
+class ResponseCache:
+    """Trwały cache odpowiedzi modelu w SQLite z limitem liczby wpisów i wieku"""
+
+    def __init__(self, path: str, max_entries: int = 1000, max_age: float = 7 * 24 * 3600):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_age = max_age
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        with self._db:
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, response TEXT NOT NULL, created REAL NOT NULL, accessed REAL NOT NULL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)")
+            self._db.execute("CREATE TABLE IF NOT EXISTS stats (name TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+
+    @staticmethod
+    def make_key(model: str, system_prompt: Optional[str], prompt: str,
+                 options: Optional[Dict[str, Any]] = None,
+                 response_format: Optional[Union[str, Dict[str, Any]]] = None) -> str:
+        """Klucz cache - hash modelu, promptu systemowego, promptu, opcji generowania i formatu odpowiedzi"""
+        parts = [model, system_prompt or '', prompt, options or {}]
+        if response_format:
+            parts.append(response_format)
+        payload = json.dumps(parts, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def _count(self, name: str):
+        self._db.execute(
+            "INSERT INTO stats (name, value) VALUES (?, 1) ON CONFLICT(name) DO UPDATE SET value = value + 1",
+            (name,)
+        )
+
+    def get(self, key: str) -> Optional[str]:
+        """Zwraca zapamiętaną odpowiedź lub None"""
+        now = time.time()
+        with self._lock, self._db:
+            row = self._db.execute(
+                "SELECT response FROM responses WHERE key = ? AND created >= ?",
+                (key, now - self.max_age)
+            ).fetchone()
+
+            if row is None:
+                self.misses += 1
+                self._count('misses')
+                return None
+
+            self._db.execute("UPDATE responses SET accessed = ? WHERE key = ?", (now, key))
+            self.hits += 1
+            self._count('hits')
+            return row[0]
+
+    def put(self, key: str, response: str):
+        """Zapisuje odpowiedź i usuwa wpisy przeterminowane / najdawniej używane"""
+        now = time.time()
+        with self._lock, self._db:
+            self._db.execute(
+                "INSERT OR REPLACE INTO responses (key, response, created, accessed) VALUES (?, ?, ?, ?)",
+                (key, response, now, now)
+            )
+            self._db.execute("DELETE FROM responses WHERE created < ?", (now - self.max_age,))
+            self._db.execute(
+                "DELETE FROM responses WHERE key IN ("
+                "SELECT key FROM responses ORDER BY accessed DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,)
+            )
+
+    def stats(self) -> Dict[str, int]:
+        """Zwraca liczniki trafień / chybień (sesji i łączne) oraz liczbę wpisów"""
+        with self._lock:
+            totals = dict(self._db.execute("SELECT name, value FROM stats").fetchall())
+            entries = self._db.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        return {
+            'entries': entries,
+            'hits': self.hits,
+            'misses': self.misses,
+            'total_hits': totals.get('hits', 0),
+            'total_misses': totals.get('misses', 0)
+        }
+
+    def clear(self):
+        """Usuwa wszystkie zapamiętane odpowiedzi"""
+        with self._lock, self._db:
+            self._db.execute("DELETE FROM responses")
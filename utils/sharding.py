@@ -0,0 +1,20 @@
+import heapq
+from typing import Callable, List, TypeVar
+
+T = TypeVar('T')
+
+
+def split_into_shards(items: List[T], shard_count: int, weight: Callable[[T], float]) -> List[List[T]]:
+    """Dzieli elementy na shardy o zbliżonej sumie wag (najcięższe elementy przydzielane najpierw)"""
+    shard_count = max(1, min(shard_count, len(items)))
+    shards: List[List[int]] = [[] for _ in range(shard_count)]
+    heap = [(0.0, index) for index in range(shard_count)]
+
+    order = sorted(range(len(items)), key=lambda i: weight(items[i]), reverse=True)
+    for item_index in order:
+        total, shard_index = heapq.heappop(heap)
+        shards[shard_index].append(item_index)
+        heapq.heappush(heap, (total + weight(items[item_index]), shard_index))
+
+    # Zachowanie pierwotnej kolejności elementów w obrębie sharda
+    return [[items[i] for i in sorted(shard)] for shard in shards if shard]
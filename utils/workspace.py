@@ -0,0 +1,143 @@
+import os
+import re
+import json
+import hashlib
+import tempfile
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, Iterator, List, Tuple
+from utils.blob_cache import git_blob_sha
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+MANIFEST_NAME = '.agent_manifest.json'
+LOCK_NAME = '.agent_workspace.lock'
+
+
+def workspace_path(base_dir: str, key: str) -> str:
+    """Katalog workspace dla klucza (np. projekt@gałąź) - czytelny prefiks i hash klucza"""
+    readable = re.sub(r'[^\w.-]+', '_', key).strip('_')[:60] or 'default'
+    return os.path.join(base_dir, f"{readable}-{hashlib.sha1(key.encode('utf-8')).hexdigest()[:8]}")
+
+
+class LocalWorkspace:
+    """Trwały katalog roboczy testów z manifestem hashy plików i ostatnich wyników testów"""
+
+    def __init__(self, path: str):
+        self.path = os.path.abspath(path)
+        self._lock = threading.Lock()
+        os.makedirs(self.path, exist_ok=True)
+
+        self.files: Dict[str, str] = {}
+        self.results: Dict[str, Dict[str, Any]] = {}
+        self._load()
+
+    @contextmanager
+    def locked(self) -> Iterator['LocalWorkspace']:
+        """Wyłączny dostęp do workspace (także między procesami / sesjami) ze świeżo wczytanym manifestem"""
+        with self._lock:
+            with open(os.path.join(self.path, LOCK_NAME), 'a+b') as lock_file:
+                if fcntl is not None:
+                    fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+                else:
+                    lock_file.seek(0)
+                    msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+                try:
+                    # Manifest mógł zostać zmieniony przez inny proces
+                    self._load()
+                    yield self
+                finally:
+                    if fcntl is not None:
+                        fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+                    else:
+                        lock_file.seek(0)
+                        msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+
+    def _load(self):
+        """Wczytuje manifest z dysku"""
+        self.files, self.results = {}, {}
+        manifest_path = os.path.join(self.path, MANIFEST_NAME)
+        if os.path.exists(manifest_path):
+            try:
+                with open(manifest_path, 'r', encoding='utf-8') as f:
+                    manifest = json.load(f)
+                self.files = manifest.get('files', {})
+                self.results = manifest.get('results', {})
+            except (OSError, ValueError):
+                # Uszkodzony manifest - wszystkie pliki zostaną zapisane ponownie
+                self.files, self.results = {}, {}
+
+    def _file_path(self, name: str) -> str:
+        file_path = os.path.abspath(os.path.join(self.path, name))
+        if os.path.commonpath([self.path, file_path]) != self.path:
+            raise Exception(f"Niedozwolona ścieżka pliku: {name}")
+        return file_path
+
+    def sync(self, tests: List[Dict]) -> Tuple[List[str], List[str]]:
+        """Zapisuje tylko nowe / zmienione pliki (wg hasha treści) i usuwa nieaktualne; zwraca (zmienione, usunięte).
+        Wywoływane w bloku locked()"""
+        changed = []
+        wanted = {}
+        for test in tests:
+            sha = git_blob_sha(test['content'].encode('utf-8'))
+            wanted[test['name']] = sha
+            file_path = self._file_path(test['name'])
+            if self.files.get(test['name']) == sha and os.path.exists(file_path):
+                continue
+            os.makedirs(os.path.dirname(file_path), exist_ok=True)
+            with open(file_path, 'w') as f:
+                f.write(test['content'])
+            changed.append(test['name'])
+
+        removed = [name for name in self.files if name not in wanted]
+        for name in removed:
+            file_path = self._file_path(name)
+            if os.path.exists(file_path):
+                os.remove(file_path)
+            self._prune_dirs(os.path.dirname(file_path))
+
+        # Wyniki usuniętych plików są nieaktualne (zmienione zachowują wyniki do ponownego uruchomienia)
+        removed_set = set(removed)
+        self.results = {nodeid: result for nodeid, result in self.results.items()
+                        if nodeid.split('::')[0] not in removed_set}
+        self.files = wanted
+        self._save()
+        return changed, removed
+
+    def _prune_dirs(self, directory: str):
+        """Usuwa puste katalogi pozostałe po usuniętych plikach"""
+        while directory != self.path and os.path.isdir(directory) and not os.listdir(directory):
+            os.rmdir(directory)
+            directory = os.path.dirname(directory)
+
+    def failed_tests(self) -> List[str]:
+        """Node ID testów, które nie przeszły w ostatnim uruchomieniu"""
+        return [nodeid for nodeid, result in self.results.items() if result['outcome'] in ('failed', 'error')]
+
+    def record_results(self, results: List[Dict[str, Any]], replace_files: Iterable[str] = (),
+                       replace_nodeids: Iterable[str] = ()):
+        """Zapisuje wyniki testów, najpierw usuwając wcześniejsze wyniki replace_files i replace_nodeids.
+        Wywoływane w bloku locked()"""
+        replaced_files, replaced_nodeids = set(replace_files), set(replace_nodeids)
+        if replaced_files or replaced_nodeids:
+            self.results = {nodeid: result for nodeid, result in self.results.items()
+                            if nodeid not in replaced_nodeids and nodeid.split('::')[0] not in replaced_files}
+        for result in results:
+            self.results[result['nodeid']] = {'outcome': result['outcome'], 'duration': result['duration']}
+        self._save()
+
+    def _save(self):
+        """Zapisuje manifest atomowo"""
+        fd, temp_path = tempfile.mkstemp(dir=self.path, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump({'files': self.files, 'results': self.results}, f)
+            os.replace(temp_path, os.path.join(self.path, MANIFEST_NAME))
+        except Exception:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise